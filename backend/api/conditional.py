@@ -0,0 +1,34 @@
+import hashlib
+
+from recipe.signals import (
+    INGREDIENTS_VERSION,
+    POPULARITY_VERSION,
+    RECIPES_VERSION,
+)
+from utils.versions import get_stamps, user_version
+
+
+def get_version_names(request):
+    names = [RECIPES_VERSION, INGREDIENTS_VERSION]
+    if request.query_params.get('ordering') == 'popular':
+        names.append(POPULARITY_VERSION)
+    if request.user.is_authenticated:
+        names.append(user_version(request.user.id))
+    return names
+
+
+def recipe_etag(request, *args, **kwargs):
+    """ETag of a recipe response, derived from version stamps only.
+
+    The response depends on the catalog, on the current user's favorites
+    and follows, on the URL and on the negotiated renderer. There is no
+    Last-Modified: If-Modified-Since has one-second precision, so a change
+    in the same second as the previous response would get a stale 304.
+    """
+    stamps = get_stamps(get_version_names(request))
+    parts = [
+        request.build_absolute_uri(),
+        request.accepted_renderer.format,
+        str(request.user.id),
+    ] + [f'{name}={version}' for name, (version, _) in stamps.items()]
+    return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
@@ -1,33 +1,67 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import filters
 
-from recipe.models import Ingredient, Recipe, Tag
-from users.models import User
+from api.reference import tags
+from api.search import search_recipes
+from recipe.models import Favorite, Ingredient, Recipe
+from utils.queries import prefix_condition
+
+
+def tag_choices():
+    return [(item['slug'], item['name']) for item in tags.get().items]
 
 
 class RecipeFilter(django_filters.FilterSet):
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    """Recipe filters that never join to-many relations.
+
+    Tag, favorite and shopping-cart conditions are EXISTS subqueries, so a
+    recipe is returned once however many of its rows match and the planner
+    can use semi- and anti-joins.
+    """
+
+    author = filters.NumberFilter(field_name='author_id')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags'
     )
     is_favorited = filters.BooleanFilter(
-        field_name='favorite__favorite', method='filter_favorite'
+        field_name='favorite', method='filter_favorite'
     )
     is_in_shopping_cart = filters.BooleanFilter(
-        field_name='favorite__shopping_cart', method='filter_favorite'
+        field_name='shopping_cart', method='filter_favorite'
+    )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'),), method='filter_ordering'
     )
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        tagged = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__slug__in=value
+        )
+        return queryset.annotate(has_tags=Exists(tagged)).filter(
+            has_tags=True
+        )
+
     def filter_favorite(self, queryset, name, value):
-        if value:
-            return queryset.filter(
-                favorite__user=self.request.user, **{name: True}
-            ).all()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+        listed = Favorite.objects.filter(
+            recipe=OuterRef('pk'), user=user, **{name: True}
+        )
+        return queryset.annotate(**{f'in_{name}': Exists(listed)}).filter(
+            **{f'in_{name}': value}
+        )
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
-        return queryset.exclude(
-            favorite__user=self.request.user, **{name: True}
-        ).all()
+    def filter_ordering(self, queryset, name, value):
+        """Most favorited first, served by recipe_popular_idx."""
+        return queryset.order_by('-favorites_count', '-pub_date', '-id')
 
     class Meta:
         model = Recipe
@@ -35,9 +69,13 @@ class RecipeFilter(django_filters.FilterSet):
 
 
 class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(
-        field_name='name', lookup_expr='istartswith'
-    )
+    name = django_filters.CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        """Prefix search served by ingredient_name_upper_idx."""
+        return queryset.filter(prefix_condition('name', value)).order_by(
+            'name'
+        )
 
     class Meta:
         model = Ingredient
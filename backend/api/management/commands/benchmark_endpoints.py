@@ -0,0 +1,456 @@
+import base64
+import io
+import json
+import random
+import tempfile
+import time
+import uuid
+from contextlib import ExitStack
+from typing import Callable, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.paginations import RecipePagination
+from recipe.models import Favorite, Ingredient, Recipe, Tag
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+CART_SIZES = (5, 50, 200)
+EXPLAIN = {'postgresql': 'EXPLAIN', 'sqlite': 'EXPLAIN QUERY PLAN'}
+
+
+class Endpoint(NamedTuple):
+    """A request to time; ``request`` returns the response.
+
+    ``max_queries`` is the regression threshold for the query count: the
+    endpoints are meant to run a fixed number of queries at any scale.
+    """
+
+    name: str
+    request: Callable
+    max_queries: int
+    status: int = 200
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def cursor(position: str) -> str:
+    """Cursor of the keyset page that starts after ``position``."""
+    return base64.b64encode(urlencode({'p': position}).encode()).decode()
+
+
+def explain(database, sql: str):
+    """Query plan of a captured statement as a list of lines."""
+    prefix = EXPLAIN.get(database.vendor)
+    if prefix is None or not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    with database.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}')
+        return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (73, 182, 78)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Command(BaseCommand):
+    help = (
+        'time the main API endpoints against the current database and fail '
+        'when latency or query counts regress'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', default=30, type=int)
+        parser.add_argument('--warmup', default=3, type=int)
+        parser.add_argument('--seed', default=0, type=int)
+        parser.add_argument(
+            '--only', nargs='+', help='Запустить только эти замеры'
+        )
+        parser.add_argument(
+            '--max-p95',
+            type=float,
+            help='Предел p95 для каждого замера, мс',
+        )
+        parser.add_argument(
+            '--output', help='Дописать результаты в файл строками JSON'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Результаты прошлого запуска (--output) для сравнения',
+        )
+        parser.add_argument(
+            '--tolerance',
+            default=1.25,
+            type=float,
+            help='Допустимый рост p95 относительно --baseline',
+        )
+        parser.add_argument(
+            '--cart-sizes',
+            nargs='+',
+            type=int,
+            default=CART_SIZES,
+            help='Размеры списков покупок для замера выгрузки без кэша',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Записать планы запросов каждого замера',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations должен быть больше нуля')
+        self.random = random.Random(options['seed'])
+        self.prepare()
+        self.carts = {}
+        try:
+            self.prepare_carts(options['cart_sizes'])
+            endpoints = self.endpoints()
+            if options['only']:
+                endpoints = [
+                    e for e in endpoints if e.name in options['only']
+                ]
+            results = [
+                self.measure(
+                    endpoint, options['iterations'], options['warmup']
+                )
+                for endpoint in endpoints
+            ]
+            if options['explain']:
+                for endpoint, result in zip(endpoints, results):
+                    result['plans'] = self.explain(endpoint)
+        finally:
+            self.remove_carts()
+        if options['output']:
+            with open(options['output'], 'a') as file:
+                for result in results:
+                    file.write(json.dumps(result) + '\n')
+        failures = self.find_regressions(endpoints, results, options)
+        if failures:
+            raise CommandError('Регрессия:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Пороги соблюдены'))
+
+    def prepare(self):
+        """Pick a user with a cart and subscriptions, like a real one."""
+        user_id = (
+            Favorite.objects.filter(shopping_cart=True)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+            .first()
+        )
+        self.user = (
+            User.objects.filter(id=user_id).first() or User.objects.first()
+        )
+        if self.user is None or not Recipe.objects.exists() or (
+            not Tag.objects.exists()
+        ):
+            raise CommandError('Нет данных, заполните базу: generate_data')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[:1000]
+        )
+        tags = list(Tag.objects.values_list('id', 'slug'))
+        self.tag_ids = [tag_id for tag_id, _ in tags]
+        self.tag_slugs = [slug for _, slug in tags]
+        self.ingredients = list(
+            Ingredient.objects.order_by('?').values_list('id', 'name')[:100]
+        )
+        self.image = image_data()
+        self.scale = {
+            'vendor': connection.vendor,
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'favorites': Favorite.objects.count(),
+        }
+        self.prepare_pages()
+        self.stdout.write(
+            ', '.join(f'{key}: {value}' for key, value in self.scale.items())
+            + f', pages: {self.last_page}'
+        )
+
+    def prepare_carts(self, sizes):
+        """Users whose carts hold the ``sizes`` most recent recipes.
+
+        Generated carts all have about the same size, so these show how
+        the download grows with the cart. remove_carts deletes them.
+        """
+        prefix = f'benchmark-cart-{uuid.uuid4().hex[:8]}'
+        for size in sizes:
+            user = User(
+                username=f'{prefix}-{size}',
+                email=f'{prefix}-{size}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            user.set_unusable_password()
+            user.save()
+            Favorite.objects.bulk_create(
+                Favorite(user=user, recipe_id=recipe_id, shopping_cart=True)
+                for recipe_id in self.recipe_ids[:size]
+            )
+            client = APIClient()
+            client.force_authenticate(user)
+            self.carts[size] = (user.id, client)
+
+    def remove_carts(self):
+        User.objects.filter(
+            id__in=[user_id for user_id, _ in self.carts.values()]
+        ).delete()
+
+    def cold_download(self, client):
+        """Download with an empty file cache, so the list is rendered."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with override_settings(SHOPPING_LIST_CACHE_DIR=cache_dir):
+                response = client.get(reverse('api:recipes-get-shopping-cart'))
+                b''.join(response.streaming_content)
+                response.close()
+        return response
+
+    def prepare_pages(self):
+        """Page number and keyset cursor of the last page of recipes."""
+        page_size = RecipePagination.page_size
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        self.last_page = max(1, -(-recipes.count() // page_size))
+        offset = (self.last_page - 1) * page_size
+        self.last_cursor = {'pagination': 'cursor'}
+        if offset:
+            position = recipes.values_list('pub_date', flat=True)[offset - 1]
+            self.last_cursor['cursor'] = cursor(str(position))
+
+    def endpoints(self):
+        recipes = reverse('api:recipes-list')
+        return [
+            Endpoint('recipe_list', lambda: self.client.get(recipes), 8),
+            Endpoint(
+                'recipe_list_filtered',
+                lambda: self.client.get(
+                    recipes,
+                    {
+                        'tags': self.random.sample(self.tag_slugs, 1),
+                        'is_favorited': self.random.choice(['0', '1']),
+                    },
+                ),
+                8,
+            ),
+            Endpoint(
+                'recipe_page_last',
+                lambda: self.client.get(recipes, {'page': self.last_page}),
+                8,
+            ),
+            Endpoint(
+                'recipe_cursor_first',
+                lambda: self.client.get(recipes, {'pagination': 'cursor'}),
+                7,
+            ),
+            Endpoint(
+                'recipe_cursor_last',
+                lambda: self.client.get(recipes, self.last_cursor),
+                7,
+            ),
+            Endpoint(
+                'recipe_list_popular',
+                lambda: self.client.get(recipes, {'ordering': 'popular'}),
+                8,
+            ),
+            Endpoint(
+                'recipe_search',
+                lambda: self.client.get(
+                    recipes,
+                    {'search': self.random.choice(self.ingredients)[1][:5]},
+                ),
+                9,
+            ),
+            Endpoint(
+                'recipe_detail',
+                lambda: self.client.get(
+                    reverse(
+                        'api:recipes-detail',
+                        args=[self.random.choice(self.recipe_ids)],
+                    )
+                ),
+                6,
+            ),
+            Endpoint(
+                'subscriptions',
+                lambda: self.client.get(
+                    reverse('api_users:user-subscriptions'),
+                    {'recipes_limit': 3},
+                ),
+                5,
+            ),
+            Endpoint(
+                'ingredient_autocomplete',
+                lambda: self.client.get(
+                    reverse('api:ingredients-list'),
+                    {'name': self.random.choice(self.ingredients)[1][:2]},
+                ),
+                2,
+            ),
+            Endpoint(
+                'ingredient_autocomplete_database',
+                self.database_autocomplete,
+                3,
+            ),
+            Endpoint(
+                'shopping_cart_download',
+                lambda: self.client.get(
+                    reverse('api:recipes-get-shopping-cart')
+                ),
+                4,
+            ),
+        ] + [
+            Endpoint(
+                f'shopping_cart_cold_{size}',
+                lambda client=client: self.cold_download(client),
+                4,
+            )
+            for size, (_, client) in self.carts.items()
+        ] + [
+            Endpoint('recipe_create', self.create_recipe, 18, 201),
+        ]
+
+    @override_settings(INGREDIENT_SEARCH_BACKEND='database')
+    def database_autocomplete(self):
+        return self.client.get(
+            reverse('api:ingredients-list'),
+            {'name': self.random.choice(self.ingredients)[1][:2]},
+        )
+
+    def create_recipe(self):
+        ingredients = self.random.sample(self.ingredients, 5)
+        return self.client.post(
+            reverse('api:recipes-list'),
+            {
+                'name': 'Тестовый рецепт',
+                'text': 'Рецепт для замера производительности',
+                'cooking_time': 10,
+                'image': self.image,
+                'tags': self.random.sample(self.tag_ids, 1),
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': 100}
+                    for ingredient_id, _ in ingredients
+                ],
+            },
+            format='json',
+        )
+
+    def measure(self, endpoint: Endpoint, iterations: int, warmup: int):
+        latencies, queries = [], []
+        for iteration in range(warmup + iterations):
+            with ExitStack() as stack:
+                captured = [
+                    stack.enter_context(CaptureQueriesContext(database))
+                    for database in connections.all()
+                ]
+                start = time.perf_counter()
+                response = endpoint.request()
+                elapsed = time.perf_counter() - start
+            self.cleanup(endpoint, response)
+            if response.status_code != endpoint.status:
+                raise CommandError(
+                    f'{endpoint.name}: ответ {response.status_code}'
+                )
+            if iteration >= warmup:
+                latencies.append(elapsed * 1000)
+                queries.append(sum(map(len, captured)))
+        result = {
+            'name': endpoint.name,
+            **self.scale,
+            **{
+                f'p{percent}': round(percentile(latencies, percent), 2)
+                for percent in PERCENTILES
+            },
+            'queries': max(queries),
+        }
+        self.stdout.write(
+            f'{endpoint.name:<34}'
+            + ''.join(
+                f' p{percent} {result[f"p{percent}"]:>8.2f} мс'
+                for percent in PERCENTILES
+            )
+            + f'  запросов {result["queries"]}'
+        )
+        return result
+
+    def cleanup(self, endpoint: Endpoint, response):
+        """Created recipes are removed so reruns measure the same data."""
+        if endpoint.status == 201 and response.status_code == 201:
+            Recipe.objects.filter(id=response.data['id']).delete()
+
+    def explain(self, endpoint: Endpoint):
+        """Plans of the SELECTs one more request of ``endpoint`` runs."""
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(database))
+                for database in connections.all()
+            ]
+            response = endpoint.request()
+        self.cleanup(endpoint, response)
+        plans = []
+        for context in captured:
+            for query in context.captured_queries:
+                plan = explain(context.connection, query['sql'])
+                if plan is not None:
+                    plans.append({'sql': query['sql'], 'plan': plan})
+                    self.stdout.write(
+                        f'{endpoint.name}: {query["sql"]}\n  '
+                        + '\n  '.join(plan)
+                    )
+        return plans
+
+    def find_regressions(self, endpoints, results, options):
+        baseline = self.load_baseline(options['baseline'])
+        failures = []
+        for endpoint, result in zip(endpoints, results):
+            name = endpoint.name
+            if result['queries'] > endpoint.max_queries:
+                failures.append(
+                    f'{name}: {result["queries"]} запросов, '
+                    f'порог {endpoint.max_queries}'
+                )
+            limit = options['max_p95']
+            previous = baseline.get(name)
+            if previous is not None:
+                allowed = previous['p95'] * options['tolerance']
+                limit = allowed if limit is None else min(limit, allowed)
+                if result['queries'] > previous['queries']:
+                    failures.append(
+                        f'{name}: {result["queries"]} запросов, '
+                        f'было {previous["queries"]}'
+                    )
+            if limit is not None and result['p95'] > limit:
+                failures.append(
+                    f'{name}: p95 {result["p95"]} мс, порог {limit:.2f} мс'
+                )
+        return failures
+
+    def load_baseline(self, path: Optional[str]):
+        """Latest result per endpoint for the same database and scale."""
+        if not path:
+            return {}
+        baseline = {}
+        with open(path) as file:
+            for line in file:
+                result = json.loads(line)
+                same_scale = all(
+                    result.get(key) == value
+                    for key, value in self.scale.items()
+                )
+                if same_scale:
+                    baseline[result['name']] = result
+        return baseline
@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+
+from recipe.models import Favorite, IngredientInRecipe
+
+AMOUNT_LIMIT = 32767
+
+
+def merge_favorites(kept, duplicate):
+    kept.favorite = kept.favorite or duplicate.favorite
+    kept.shopping_cart = kept.shopping_cart or duplicate.shopping_cart
+
+
+def merge_ingredients(kept, duplicate):
+    kept.amount = min(kept.amount + duplicate.amount, AMOUNT_LIMIT)
+
+
+RELATIONS = (
+    (
+        Favorite,
+        ('user_id', 'recipe_id'),
+        merge_favorites,
+        ['favorite', 'shopping_cart'],
+    ),
+    (
+        IngredientInRecipe,
+        ('recipe_id', 'ingredient_id'),
+        merge_ingredients,
+        ['amount'],
+    ),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'merge duplicate Favorite and IngredientInRecipe rows; '
+        'run before migrating to the unique constraints'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        for model, key_fields, merge, merged_fields in RELATIONS:
+            removed = self.dedupe(
+                model, key_fields, merge, merged_fields, options['batch_size']
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{model._meta.verbose_name}: удалено дублей {removed}'
+                )
+            )
+
+    def dedupe(self, model, key_fields, merge, merged_fields, batch_size):
+        """Merge duplicate groups into their oldest row, batch by batch.
+
+        Rows are updated and deleted without signals: the command runs
+        before migrate, when the tables and columns the receivers write to
+        may not exist yet. Each batch commits on its own, so an
+        interrupted run is finished by running the command again.
+        """
+        groups = (
+            model.objects.values(*key_fields)
+            .annotate(rows=Count('id'))
+            .filter(rows__gt=1)
+            .order_by()
+        )
+        removed = 0
+        while True:
+            batch = list(groups[:batch_size])
+            if not batch:
+                return removed
+            condition = Q()
+            for group in batch:
+                condition |= Q(**{field: group[field] for field in key_fields})
+            with transaction.atomic():
+                kept, duplicates = {}, []
+                for row in model.objects.filter(condition).order_by('id'):
+                    key = tuple(getattr(row, field) for field in key_fields)
+                    if key in kept:
+                        merge(kept[key], row)
+                        duplicates.append(row.id)
+                    else:
+                        kept[key] = row
+                model.objects.bulk_update(kept.values(), merged_fields)
+                model.objects.filter(id__in=duplicates)._raw_delete(
+                    model.objects.db
+                )
+            removed += len(duplicates)
+            self.stdout.write(f'Обработано групп: {len(batch)}')
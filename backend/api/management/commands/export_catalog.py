@@ -0,0 +1,31 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.catalog import export_catalog
+
+
+class Command(BaseCommand):
+    help = 'export every recipe as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'filename', nargs='?', help='Файл, по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--chunk-size', default=settings.CATALOG_CHUNK_SIZE, type=int
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть больше нуля')
+        lines = export_catalog(options['chunk_size'])
+        if not options['filename']:
+            sys.stdout.writelines(lines)
+            return
+        total = 0
+        with open(options['filename'], 'w', encoding='utf-8') as file:
+            for total, line in enumerate(lines, 1):
+                file.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Готово, рецептов: {total}'))
@@ -0,0 +1,261 @@
+import io
+import random
+import uuid
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipe.models import Favorite, Ingredient, IngredientInRecipe, Recipe, Tag
+from recipe.search import uses_search_vector
+from recipe.signals import (
+    INGREDIENTS_VERSION,
+    PANTRY_VERSION,
+    POPULARITY_VERSION,
+    RECIPES_VERSION,
+    TAGS_VERSION,
+)
+from users.models import Follow, User
+from utils.queries import batches
+from utils.versions import bump_version
+
+IMAGE_NAME = 'recipes/images/synthetic.png'
+PASSWORD = 'synthetic-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'паста',
+    'томатный', 'сырный', 'овощной', 'куриный', 'грибной', 'быстрый',
+    'домашний', 'острый', 'летний', 'пряный', 'сливочный',
+)
+
+
+def skewed_weights(size):
+    """Cumulative Zipf-like weights: a few items get most of the attention.
+
+    Cumulative, so random.choices does not sum them again on every call.
+    """
+    return list(accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = 'fill the database with synthetic users, recipes and lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=100, type=int)
+        parser.add_argument('--recipes', default=1000, type=int)
+        parser.add_argument(
+            '--ingredients-per-recipe', default=(3, 12), nargs=2, type=int
+        )
+        parser.add_argument('--follows-per-user', default=5, type=int)
+        parser.add_argument('--favorites-per-user', default=20, type=int)
+        parser.add_argument('--cart-per-user', default=5, type=int)
+        parser.add_argument('--batch-size', default=1000, type=int)
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--users и --batch-size должны быть больше 0')
+        low, high = options['ingredients_per_recipe']
+        if not 1 <= low <= high:
+            raise CommandError('Некорректный --ingredients-per-recipe')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < high:
+            raise CommandError(
+                'Недостаточно ингредиентов, загрузите их: loading_ingredients'
+            )
+        self.ensure_image()
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(user_ids, options['recipes'])
+            self.create_compositions(
+                recipe_ids, ingredient_ids, tag_ids, low, high
+            )
+            self.create_follows(user_ids, options['follows_per_user'])
+            self.create_favorites(
+                user_ids,
+                recipe_ids,
+                options['favorites_per_user'],
+                options['cart_per_user'],
+            )
+        self.finish()
+
+    def bulk_create(self, model, objects):
+        """Insert ``objects`` --batch-size at a time, return how many.
+
+        ``objects`` may be a generator, so no more than a batch of rows is
+        held in memory; Django splits each batch further where the backend
+        limits query parameters.
+        """
+        created = 0
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch)
+            created += len(batch)
+        return created
+
+    def ensure_image(self):
+        if default_storage.exists(IMAGE_NAME):
+            return
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (226, 108, 45)).save(buffer, 'PNG')
+        default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+
+    def create_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        """Users share one password hash; hashing per user would dominate."""
+        prefix = f'synthetic-{uuid.uuid4().hex[:8]}'
+        password = make_password(PASSWORD)
+        self.bulk_create(
+            User,
+            (
+                User(
+                    username=f'{prefix}-{number}',
+                    email=f'{prefix}-{number}@example.com',
+                    first_name='Имя',
+                    last_name='Фамилия',
+                    password=password,
+                )
+                for number in range(count)
+            ),
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=prefix).values_list(
+                'id', flat=True
+            )
+        )
+        self.stdout.write(f'Пользователей: {len(user_ids)}, {prefix}')
+        return user_ids
+
+    def create_recipes(self, user_ids, count):
+        authors = self.random.choices(
+            user_ids, cum_weights=skewed_weights(len(user_ids)), k=count
+        )
+        self.bulk_create(
+            Recipe,
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=' '.join(self.random.sample(WORDS, 2)).capitalize(),
+                    text=' '.join(self.random.choices(WORDS, k=30)),
+                    image=IMAGE_NAME,
+                    cooking_time=self.random.randint(5, 180),
+                )
+                for author_id in authors
+            ),
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(author_id__in=user_ids).values_list(
+                'id', flat=True
+            )
+        )
+        self.stdout.write(f'Рецептов: {len(recipe_ids)}')
+        return recipe_ids
+
+    def create_compositions(
+        self, recipe_ids, ingredient_ids, tag_ids, low, high
+    ):
+        weights = skewed_weights(len(ingredient_ids))
+
+        def compositions():
+            for recipe_id in recipe_ids:
+                chosen = set()
+                size = self.random.randint(low, high)
+                while len(chosen) < size:
+                    chosen.update(
+                        self.random.choices(
+                            ingredient_ids, cum_weights=weights, k=size
+                        )
+                    )
+                for ingredient_id in list(chosen)[:size]:
+                    yield IngredientInRecipe(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.random.randint(1, 500),
+                    )
+
+        def tags():
+            for recipe_id in recipe_ids:
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, len(tag_ids))
+                ):
+                    yield Recipe.tags.through(
+                        recipe_id=recipe_id, tag_id=tag_id
+                    )
+
+        created = self.bulk_create(IngredientInRecipe, compositions())
+        self.bulk_create(Recipe.tags.through, tags())
+        self.stdout.write(f'Ингредиентов в рецептах: {created}')
+
+    def create_follows(self, user_ids, per_user):
+        weights = skewed_weights(len(user_ids))
+
+        def follows():
+            for user_id in user_ids:
+                authors = set(
+                    self.random.choices(
+                        user_ids, cum_weights=weights, k=per_user
+                    )
+                ) - {user_id}
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        created = self.bulk_create(Follow, follows())
+        self.stdout.write(f'Подписок: {created}')
+
+    def create_favorites(self, user_ids, recipe_ids, favorites, cart):
+        weights = skewed_weights(len(recipe_ids))
+
+        def rows():
+            for user_id in user_ids:
+                favorite = set(
+                    self.random.choices(
+                        recipe_ids, cum_weights=weights, k=favorites
+                    )
+                )
+                in_cart = set(
+                    self.random.sample(recipe_ids, min(cart, len(recipe_ids)))
+                )
+                for recipe_id in favorite | in_cart:
+                    yield Favorite(
+                        user_id=user_id,
+                        recipe_id=recipe_id,
+                        favorite=recipe_id in favorite,
+                        shopping_cart=recipe_id in in_cart,
+                    )
+
+        created = self.bulk_create(Favorite, rows())
+        self.stdout.write(f'Строк избранного и покупок: {created}')
+
+    def finish(self):
+        """Bulk inserts skip signals: rebuild what they would maintain."""
+        call_command('reconcile_counters', batch_size=self.batch_size)
+        if uses_search_vector():
+            call_command('update_search_vectors', batch_size=self.batch_size)
+        for name in (
+            RECIPES_VERSION,
+            INGREDIENTS_VERSION,
+            TAGS_VERSION,
+            PANTRY_VERSION,
+            POPULARITY_VERSION,
+        ):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS('Готово'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipe.models import Recipe
+from utils.images import generate
+
+
+class Command(BaseCommand):
+    help = 'generate missing recipe image derivatives'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.exclude(derivatives_of=F('image'))
+        recipe_ids = list(recipes.values_list('id', flat=True))
+        for number, recipe_id in enumerate(recipe_ids, 1):
+            generate(recipe_id)
+            self.stdout.write(f'Обработано рецептов: {number}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Готово, рецептов: {len(recipe_ids)}')
+        )
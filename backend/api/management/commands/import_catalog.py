@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.catalog import CatalogImporter
+from utils.queries import batches
+
+
+def read_records(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = 'import recipes exported by export_catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename')
+        parser.add_argument('--batch-size', default=500, type=int)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        importer = CatalogImporter()
+        try:
+            with open(options['filename'], encoding='utf-8') as file:
+                records = read_records(file)
+                for batch in batches(records, options['batch_size']):
+                    importer.load(batch)
+                    self.stdout.write(
+                        f'Обработано рецептов: {importer.created}'
+                    )
+        except FileNotFoundError:
+            raise CommandError('Файл не найден!')
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Некорректный JSON: {error}')
+        except KeyError as error:
+            raise CommandError(f'В записи нет поля {error}')
+
+        skipped = ', '.join(
+            f'{reason}: {count}' for reason, count in importer.skipped.items()
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Добавлено рецептов: {importer.created}, '
+                f'пропущено: {skipped or 0}'
+            )
+        )
+        if importer.created:
+            self.stdout.write(
+                'Скопируйте изображения рецептов в MEDIA_ROOT и запустите '
+                'generate_image_derivatives'
+            )
@@ -1,35 +1,168 @@
+import csv
+import io
 import json
 import os
+import re
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
 from recipe.models import Ingredient
+from recipe.signals import INGREDIENTS_VERSION
+from utils.queries import batches
+from utils.versions import bump_version
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+CHUNK_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+FORMATS = ('json', 'ndjson', 'csv')
+
+
+def read_json(file):
+    """Yield the items of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE)
+    pos = SEPARATORS.match(buffer).end()
+    if buffer[pos:pos + 1] != '[':
+        raise CommandError('Ожидался JSON-массив ингредиентов')
+    pos += 1
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON')
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            item = json.loads(line)
+            yield item['name'], item['measurement_unit']
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {'json': read_json, 'ndjson': read_ndjson, 'csv': read_csv}
 
 
 class Command(BaseCommand):
-    help = 'loading ingredients in JSON format'
+    help = 'loading ingredients in JSON, NDJSON or CSV format'
 
     def add_arguments(self, parser):
         parser.add_argument(
             'filename', default='ingredients.json', nargs='?', type=str
         )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению',
+        )
+        parser.add_argument('--batch-size', default=5000, type=int)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать файл, ничего не записывая в базу',
+        )
 
     def handle(self, *args, **options):
-        try:
-            with open(
-                os.path.join(DATA_ROOT, options['filename']),
-                'r',
-                encoding='utf-8',
-            ) as f:
-                data = json.load(f)
-                for ingredient in data:
-                    Ingredient.objects.update_or_create(
-                        name=ingredient['name'],
-                        measurement_unit=ingredient['measurement_unit'],
-                    )
+        path = os.path.join(DATA_ROOT, options['filename'])
+        file_format = options['format'] or os.path.splitext(path)[1][1:]
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
 
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                rows = READERS[file_format](f)
+                if options['dry_run']:
+                    total = self.count(rows, options['batch_size'])
+                    created = 0
+                else:
+                    total, created = self.load(rows, options['batch_size'])
         except FileNotFoundError:
             raise CommandError('Файл не найден!')
+        except (KeyError, IndexError):
+            raise CommandError('В строке нет названия или единиц измерения')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Прочитано строк: {total}, добавлено ингредиентов: {created}'
+            )
+        )
+
+    def progress(self, total):
+        self.stdout.write(f'Обработано строк: {total}')
+
+    def count(self, rows, batch_size):
+        total = 0
+        for batch in batches(rows, batch_size):
+            total += len(batch)
+            self.progress(total)
+        return total
+
+    @transaction.atomic
+    def load(self, rows, batch_size):
+        before = Ingredient.objects.count()
+        if connection.vendor == 'postgresql':
+            total = self.copy(rows, batch_size)
+        else:
+            total = self.bulk_create(rows, batch_size)
+        transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION))
+        return total, Ingredient.objects.count() - before
+
+    def bulk_create(self, rows, batch_size):
+        total = 0
+        for batch in batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ),
+                ignore_conflicts=True,
+            )
+            total += len(batch)
+            self.progress(total)
+        return total
+
+    def copy(self, rows, batch_size):
+        """COPY rows into a temporary staging table, then upsert them."""
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            for batch in batches(rows, batch_size):
+                data = io.StringIO()
+                csv.writer(data).writerows(batch)
+                data.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    data,
+                )
+                total += len(batch)
+                self.progress(total)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_staging '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+        return total
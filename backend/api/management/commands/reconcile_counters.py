@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipe.models import Favorite, Recipe
+from recipe.signals import POPULARITY_VERSION
+from users.models import Follow, User
+from utils.versions import bump_version
+
+
+def count_of(queryset, field):
+    """Correlated COUNT(*) of ``queryset`` rows whose ``field`` is the
+    outer row."""
+    counted = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+COUNTERS = (
+    (
+        Recipe,
+        {
+            'favorites_count': count_of(
+                Favorite.objects.filter(favorite=True), 'recipe'
+            ),
+            'cart_count': count_of(
+                Favorite.objects.filter(shopping_cart=True), 'recipe'
+            ),
+        },
+    ),
+    (
+        User,
+        {
+            'recipes_count': count_of(Recipe.objects, 'author'),
+            'followers_count': count_of(Follow.objects, 'author'),
+        },
+    ),
+)
+
+
+class Command(BaseCommand):
+    help = 'recompute denormalized recipe and user counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        for model, counters in COUNTERS:
+            updated = self.reconcile(model, counters, options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{model._meta.verbose_name}: пересчитано {updated}'
+                )
+            )
+        # update() sends no signals, so nothing else invalidates the
+        # cached popular ordering.
+        bump_version(POPULARITY_VERSION)
+
+    def reconcile(self, model, counters, batch_size):
+        """Recount each id range in one UPDATE of correlated subqueries."""
+        ids = model.objects.order_by('id').values_list('id', flat=True)
+        last_id, updated = 0, 0
+        while True:
+            batch = list(ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return updated
+            updated += model.objects.filter(id__in=batch).update(**counters)
+            last_id = batch[-1]
+            self.stdout.write(f'Обработано: {updated}')
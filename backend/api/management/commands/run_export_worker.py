@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.exports import (
+    claim_job,
+    expire_exports,
+    requeue_stale_jobs,
+    run_job,
+)
+
+
+class Command(BaseCommand):
+    help = 'render queued shopping-list exports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        interval = settings.EXPORT_CLEANUP_INTERVAL
+        cleaned_at = float('-inf')
+        while True:
+            if time.monotonic() - cleaned_at > interval:
+                requeue_stale_jobs()
+                expired = expire_exports()
+                if expired:
+                    self.stdout.write(f'Удалено выгрузок: {expired}')
+                cleaned_at = time.monotonic()
+
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(settings.EXPORT_WORKER_POLL_INTERVAL)
+                continue
+            run_job(job)
+            self.stdout.write(f'Выгрузка {job.id}: {job.status}')
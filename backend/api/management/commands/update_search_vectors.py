@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.models import Recipe
+from recipe.search import refresh_search_vectors, uses_search_vector
+
+
+class Command(BaseCommand):
+    help = 'recompute Recipe.search_vector for every recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        if not uses_search_vector():
+            raise CommandError('Поисковый индекс есть только в PostgreSQL')
+        recipe_ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+        last_id, updated = 0, 0
+        while True:
+            batch = list(
+                recipe_ids.filter(id__gt=last_id)[: options['batch_size']]
+            )
+            if not batch:
+                break
+            updated += refresh_search_vectors(
+                Recipe.objects.filter(id__in=batch)
+            )
+            last_id = batch[-1]
+            self.stdout.write(f'Обработано рецептов: {updated}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, рецептов: {updated}'))
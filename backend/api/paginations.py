@@ -1,7 +1,105 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the row count from the PostgreSQL planner.
+
+    Estimates below ``exact_count_below`` are replaced by a real COUNT.
+    """
+
+    exact_count_below = 0
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate < self.exact_count_below:
+            return super().count
+        return estimate
+
+
+class RecipeCursorPagination(CursorPagination):
+    ordering = ('-pub_date', '-id')
+    page_size = 5
+    page_size_query_param = 'limit'
+    max_page_size = 10
+
+
+class UserCursorPagination(CursorPagination):
+    ordering = ('username', 'id')
+    page_size = 5
+    page_size_query_param = 'limit'
+    max_page_size = 10
 
 
 class PagePagination(PageNumberPagination):
+    """Page-number pagination with per-request opt-ins.
+
+    ``?pagination=cursor`` (or any ``cursor`` parameter) switches to
+    keyset pagination when ``cursor_pagination_class`` is set, and
+    ``?count=estimated`` replaces COUNT(*) with the planner estimate.
+    """
+
     page_size = 5
     page_size_query_param = 'limit'
     max_page_size = 10
+    cursor_pagination_class = None
+
+    def use_cursor(self, request):
+        return self.cursor_pagination_class is not None and (
+            request.query_params.get('pagination') == 'cursor'
+            or 'cursor' in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        if request.query_params.get('count') == 'estimated':
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(PagePagination):
+    cursor_pagination_class = RecipeCursorPagination
+
+    def use_cursor(self, request):
+        """Cursors follow publication order only: the popular ordering has
+        too many ties in favorites_count for a keyset over it."""
+        use_cursor = super().use_cursor(request)
+        if use_cursor and request.query_params.get('ordering') == 'popular':
+            raise ValidationError(
+                {
+                    'ordering': [
+                        'Сортировка popular недоступна с pagination=cursor'
+                    ]
+                }
+            )
+        return use_cursor
+
+
+class UserPagination(PagePagination):
+    cursor_pagination_class = UserCursorPagination
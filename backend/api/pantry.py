@@ -0,0 +1,169 @@
+import heapq
+import threading
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from django.conf import settings
+
+from recipe.models import IngredientInRecipe
+from recipe.signals import PANTRY_VERSION
+from utils.replicas import primary
+from utils.versions import get_changes, get_version
+
+
+def to_mask(ingredient_ids: Iterable[int], positions: Dict[int, int]) -> int:
+    mask = 0
+    for ingredient_id in ingredient_ids:
+        mask |= 1 << positions[ingredient_id]
+    return mask
+
+
+def count_bits(mask: int) -> int:
+    return bin(mask).count('1')
+
+
+class Composition(NamedTuple):
+    ingredients: FrozenSet[int]
+    mask: int
+
+
+class Match(NamedTuple):
+    recipe_id: int
+    coverage: float
+    missing: List[int]
+
+
+class PantryIndex:
+    """Ingredient -> recipe inverted index with per-recipe bitsets.
+
+    Every ingredient used by some recipe gets a dense bit position, and a
+    recipe's mask has the bits of its ingredients set, so the ingredients
+    it shares with a pantry are one AND away. Positions are only ever
+    added, never reassigned, so masks built before a rebuild stay valid
+    and the mask size follows the number of ingredients, not their ids.
+    Changes logged under PANTRY_VERSION are replayed recipe by recipe;
+    the index is only reloaded whole on first use or when the log has
+    gaps. Postings are replaced rather than mutated, so readers never
+    see a set change under them.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.recipes: Dict[int, Composition] = {}
+        self.postings: Dict[int, FrozenSet[int]] = {}
+        self.positions: Dict[int, int] = {}
+        self.lock = threading.Lock()
+
+    def ensure_fresh(self) -> None:
+        version = get_version(PANTRY_VERSION)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            if not self.replay(version):
+                self.rebuild(version)
+
+    @primary()
+    def load(self, recipe_ids=None) -> Dict[int, Set[int]]:
+        rows = IngredientInRecipe.objects.order_by()
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        compositions = defaultdict(set)
+        for recipe_id, ingredient_id in rows.values_list(
+            'recipe_id', 'ingredient_id'
+        ):
+            compositions[recipe_id].add(ingredient_id)
+        return compositions
+
+    def add_positions(self, ingredient_ids: Iterable[int]) -> None:
+        for ingredient_id in ingredient_ids:
+            if ingredient_id not in self.positions:
+                self.positions[ingredient_id] = len(self.positions)
+
+    def rebuild(self, version: int) -> None:
+        postings = defaultdict(set)
+        recipes = {}
+        for recipe_id, ingredient_ids in self.load().items():
+            self.add_positions(ingredient_ids)
+            recipes[recipe_id] = Composition(
+                frozenset(ingredient_ids),
+                to_mask(ingredient_ids, self.positions),
+            )
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id].add(recipe_id)
+        self.recipes = recipes
+        self.postings = {
+            ingredient_id: frozenset(recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.version = version
+
+    def replay(self, version: int) -> bool:
+        if self.version is None:
+            return False
+        if version - self.version > settings.PANTRY_REPLAY_LIMIT:
+            return False
+        changed = get_changes(PANTRY_VERSION, self.version, version)
+        if changed is None:
+            return False
+        compositions = self.load(set(changed))
+        for recipe_id in set(changed):
+            self.update(recipe_id, frozenset(compositions.get(recipe_id, ())))
+        self.version = version
+        return True
+
+    def update(self, recipe_id: int, ingredient_ids: FrozenSet[int]) -> None:
+        self.add_positions(ingredient_ids)
+        previous = self.recipes.get(recipe_id)
+        old = previous.ingredients if previous else frozenset()
+        for ingredient_id in old - ingredient_ids:
+            recipe_ids = self.postings[ingredient_id] - {recipe_id}
+            self.postings[ingredient_id] = recipe_ids
+        for ingredient_id in ingredient_ids - old:
+            recipe_ids = self.postings.get(ingredient_id, frozenset())
+            self.postings[ingredient_id] = recipe_ids | {recipe_id}
+        if ingredient_ids:
+            self.recipes[recipe_id] = Composition(
+                ingredient_ids, to_mask(ingredient_ids, self.positions)
+            )
+        else:
+            self.recipes.pop(recipe_id, None)
+
+    def match(self, pantry: Iterable[int], limit: int) -> List[Match]:
+        """Recipes sharing an ingredient with ``pantry``, ranked by the
+        share of their ingredients on hand, then by fewest missing."""
+        self.ensure_fresh()
+        pantry = {
+            ingredient_id
+            for ingredient_id in pantry
+            if ingredient_id in self.postings
+        }
+        pantry_mask = to_mask(pantry, self.positions)
+        candidates = set()
+        for ingredient_id in pantry:
+            candidates |= self.postings.get(ingredient_id, frozenset())
+
+        ranked = []
+        for recipe_id in candidates:
+            composition = self.recipes.get(recipe_id)
+            if composition is None:
+                continue
+            total = len(composition.ingredients)
+            missing = total - count_bits(composition.mask & pantry_mask)
+            ranked.append(
+                ((missing - total) / total, missing, -recipe_id, composition)
+            )
+        return [
+            Match(
+                recipe_id=-negated_id,
+                coverage=-share,
+                missing=sorted(composition.ingredients - pantry),
+            )
+            for share, _, negated_id, composition in heapq.nsmallest(
+                limit, ranked
+            )
+        ]
+
+
+pantry_index = PantryIndex()
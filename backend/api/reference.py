@@ -0,0 +1,81 @@
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import QuerySet
+from rest_framework.renderers import JSONRenderer
+
+from recipe.models import Ingredient, Tag
+from recipe.signals import INGREDIENTS_VERSION, TAGS_VERSION
+from utils.replicas import primary
+from utils.versions import get_version, on_bump
+
+Item = Dict[str, Any]
+
+
+class Snapshot(NamedTuple):
+    version: int
+    items: Tuple[Item, ...]
+    by_id: Mapping[int, Item]
+    content: bytes
+
+
+class ReferenceData:
+    """Per-process, pre-serialized snapshot of a small reference table.
+
+    The shared version is checked at most once per
+    REFERENCE_DATA_CHECK_INTERVAL seconds, so other workers pick up a
+    change within that interval; bumps made by this process are seen
+    immediately.
+    """
+
+    def __init__(self, version_name: str, queryset: QuerySet, fields):
+        self.version_name = version_name
+        self.queryset = queryset
+        self.fields = fields
+        self.snapshot: Optional[Snapshot] = None
+        self.checked_at = float('-inf')
+        self.lock = threading.Lock()
+        on_bump(version_name, self.invalidate)
+
+    def invalidate(self) -> None:
+        self.checked_at = float('-inf')
+
+    def get(self) -> Snapshot:
+        now = time.monotonic()
+        snapshot = self.snapshot
+        interval = settings.REFERENCE_DATA_CHECK_INTERVAL
+        if snapshot is not None and now - self.checked_at < interval:
+            return snapshot
+
+        version = get_version(self.version_name)
+        if snapshot is None or snapshot.version != version:
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self.build(version)
+                    self.snapshot = snapshot
+        self.checked_at = now
+        return snapshot
+
+    @primary()
+    def build(self, version: int) -> Snapshot:
+        items = tuple(self.queryset.all().values(*self.fields))
+        return Snapshot(
+            version=version,
+            items=items,
+            by_id=MappingProxyType({item['id']: item for item in items}),
+            content=JSONRenderer().render(list(items)),
+        )
+
+
+tags = ReferenceData(
+    TAGS_VERSION, Tag.objects.all(), ('id', 'name', 'color', 'slug')
+)
+ingredients = ReferenceData(
+    INGREDIENTS_VERSION,
+    Ingredient.objects.all(),
+    ('id', 'name', 'measurement_unit'),
+)
@@ -0,0 +1,193 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Case, F, IntegerField, QuerySet, Value, When
+
+from api.reference import ingredients
+from recipe.models import IngredientInRecipe, Recipe
+from recipe.search import uses_search_vector
+from recipe.signals import RECIPES_VERSION
+from utils.replicas import primary
+from utils.versions import get_version
+
+Match = Dict[str, Union[int, str]]
+Postings = Dict[str, Counter]
+
+WORD = re.compile(r'\w+')
+NAME_WEIGHT = 4
+INGREDIENT_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return WORD.findall(text.casefold()) if text else []
+
+
+class IngredientIndex:
+    """Sorted, case-folded copy of the ingredient catalog.
+
+    The index is rebuilt lazily from the ingredients reference snapshot
+    whenever that snapshot changes. Prefix matches are found by binary
+    search and ranked above substring matches.
+    """
+
+    def __init__(self):
+        self.source = None
+        self.snapshot: Tuple[List[str], List[Match]] = ([], [])
+        self.lock = threading.Lock()
+
+    def ensure_fresh(self) -> None:
+        source = ingredients.get()
+        if source is self.source:
+            return
+        with self.lock:
+            if source is not self.source:
+                self.rebuild(source)
+
+    def rebuild(self, source) -> None:
+        items = sorted(
+            source.items,
+            key=lambda item: (item['name'].casefold(), item['id']),
+        )
+        keys = [item['name'].casefold() for item in items]
+        self.snapshot = (keys, items)
+        self.source = source
+
+    def search(self, query: str, limit: int) -> List[Match]:
+        self.ensure_fresh()
+        keys, items = self.snapshot
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and end - start < limit:
+            if not keys[end].startswith(query):
+                break
+            end += 1
+        matches = items[start:end]
+        if len(matches) >= limit:
+            return matches
+
+        for position, key in enumerate(keys):
+            if query in key and not key.startswith(query):
+                matches.append(items[position])
+                if len(matches) == limit:
+                    break
+        return matches
+
+
+ingredient_index = IngredientIndex()
+
+
+class RecipeIndex:
+    """In-process inverted index over recipe names, ingredients and text.
+
+    Stands in for the search_vector column where PostgreSQL text search
+    is unavailable. Rebuilt when the recipes version changes. Every query
+    word has to match some indexed word by prefix, a rough substitute
+    for stemming; a recipe scores the weighted number of occurrences.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.snapshot: Tuple[List[str], Postings] = ([], {})
+        self.lock = threading.Lock()
+
+    def ensure_fresh(self) -> None:
+        version = get_version(RECIPES_VERSION)
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.rebuild(version)
+
+    @primary()
+    def rebuild(self, version: int) -> None:
+        postings: Postings = defaultdict(Counter)
+
+        def add(recipe_id, text, weight):
+            for word in tokenize(text):
+                postings[word][recipe_id] += weight
+
+        recipes = Recipe.objects.order_by().values_list('id', 'name', 'text')
+        for recipe_id, name, text in recipes:
+            add(recipe_id, name, NAME_WEIGHT)
+            add(recipe_id, text, TEXT_WEIGHT)
+        rows = IngredientInRecipe.objects.order_by().values_list(
+            'recipe_id', 'ingredient__name'
+        )
+        for recipe_id, name in rows:
+            add(recipe_id, name, INGREDIENT_WEIGHT)
+        self.snapshot = (sorted(postings), dict(postings))
+        self.version = version
+
+    def match(self, word: str) -> Counter:
+        words, postings = self.snapshot
+        scores = Counter()
+        for position in range(bisect_left(words, word), len(words)):
+            if not words[position].startswith(word):
+                break
+            scores.update(postings[words[position]])
+        return scores
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """Ids of recipes matching every word of ``query``, best first."""
+        self.ensure_fresh()
+        scores = None
+        for word in set(tokenize(query)):
+            matched = self.match(word)
+            if scores is not None:
+                matched = Counter(
+                    {
+                        recipe_id: scores[recipe_id] + score
+                        for recipe_id, score in matched.items()
+                        if recipe_id in scores
+                    }
+                )
+            scores = matched
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [recipe_id for recipe_id, _ in ranked[:limit]]
+
+
+recipe_index = RecipeIndex()
+
+
+def search_recipes(queryset: QuerySet, query: str) -> QuerySet:
+    """Narrow ``queryset`` to recipes matching ``query``, best first.
+
+    On PostgreSQL the match runs against recipe_search_vector_idx, so it
+    combines with the other filters as one indexed query; elsewhere the
+    ids come from ``recipe_index``, capped at RECIPE_SEARCH_LIMIT.
+    """
+    if uses_search_vector():
+        search_query = SearchQuery(
+            query, config=settings.RECIPE_SEARCH_CONFIG
+        )
+        return (
+            queryset.filter(search_vector=search_query)
+            .annotate(search_rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-search_rank', '-pub_date', '-id')
+        )
+    recipe_ids = recipe_index.search(query, settings.RECIPE_SEARCH_LIMIT)
+    if not recipe_ids:
+        return queryset.none()
+    position = Case(
+        *(
+            When(id=recipe_id, then=Value(number))
+            for number, recipe_id in enumerate(recipe_ids)
+        ),
+        output_field=IntegerField(),
+    )
+    return (
+        queryset.filter(id__in=recipe_ids)
+        .annotate(search_rank=position)
+        .order_by('search_rank')
+    )
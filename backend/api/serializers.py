@@ -1,36 +1,122 @@
-from django.db.models import F
+from django.conf import settings
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
+from django.urls import reverse
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.generics import get_object_or_404
 
-from recipe.models import Favorite, Ingredient, IngredientInRecipe, Recipe, Tag
-from users.models import Follow, User
+from api.reference import tags
+from recipe.models import (
+    ExportJob,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    Tag,
+)
+from users.membership import get_request_membership
+from users.models import User
 from users.serializers import CustomUserSerializer
+from utils.images import get_image_urls
+
+# Upper bound of IngredientInRecipe.amount, a PositiveSmallIntegerField.
+MAX_AMOUNT = 32767
+
+
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return limit if limit >= 0 else None
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    images = serializers.SerializerMethodField()
+
     class Meta:
-        fields = '__all__'
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
         model = Recipe
 
+    def get_images(self, obj):
+        return get_image_urls(obj, self.context.get('request'))
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
+class PantrySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.PANTRY_MAX_INGREDIENTS,
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.PANTRY_LIMIT, default=10
+    )
+
+
+class PantryMatchSerializer(FavoriteSerializer):
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True
+    )
+
+    class Meta(FavoriteSerializer.Meta):
+        fields = FavoriteSerializer.Meta.fields + ('coverage', 'missing')
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        fields = (
+            'id',
+            'file_format',
+            'status',
+            'error',
+            'created',
+            'finished',
+            'url',
+        )
+        model = ExportJob
+
+    def get_url(self, obj):
+        if obj.status != ExportJob.DONE:
+            return None
+        url = reverse(
+            'api:recipes-export-shopping-cart-file', kwargs={'job_id': obj.id}
+        )
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         fields = '__all__'
         model = Tag
 
+    def to_representation(self, instance):
+        item = tags.get().by_id.get(instance.pk)
+        if item is None:
+            return super().to_representation(instance)
+        return item
+
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
-    amount = serializers.SerializerMethodField()
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
 
     class Meta:
         fields = ('id', 'name', 'measurement_unit', 'amount')
-        model = Ingredient
-        read_only_fields = ['id', 'name', 'measurement_unit']
-
-        def get_amount(self, obj):
-            return obj.ingredientinrecipe.values('amount')[0].get('amount')
+        model = IngredientInRecipe
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -40,10 +126,11 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    author = CustomUserSerializer(read_only=True)
+    author = serializers.SerializerMethodField()
     tags = TagSerializer(read_only=True, many=True)
     ingredients = serializers.SerializerMethodField()
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -57,98 +144,133 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time',
         )
         model = Recipe
 
+    def get_images(self, obj):
+        return get_image_urls(obj, self.context.get('request'))
+
+    def get_author(self, obj):
+        return CustomUserSerializer(obj.author, context=self.context).data
+
     def get_ingredients(self, obj):
-        ingredients = obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredient_in_recipe__amount'),
-        )
-        return ingredients
+        ingredients = obj.ingredient_in_recipe.all()
+        prefetched = getattr(obj, '_prefetched_objects_cache', {})
+        if 'ingredient_in_recipe' not in prefetched:
+            ingredients = ingredients.select_related('ingredient')
+        return IngredientInRecipeSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        recipe = Favorite.objects.filter(
-            recipe_id=obj.id, user_id=user.id
-        ).first()
-        if recipe:
-            return recipe.favorite
-        return False
+        request = self.context.get('request')
+        return obj.id in get_request_membership(request).favorite
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        recipe = Favorite.objects.filter(
-            recipe_id=obj.id, user_id=user.id
-        ).first()
-        if recipe:
-            return recipe.shopping_cart
-        return False
+        request = self.context.get('request')
+        return obj.id in get_request_membership(request).shopping_cart
 
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
+        amounts = self.validate_amounts(self.initial_data.get('ingredients'))
+        if Ingredient.objects.filter(id__in=amounts).count() != len(amounts):
+            raise ValidationError(
+                detail={'ingredients': ['Такого ингредиента не существует :(']}
+            )
+
+        try:
+            tag_ids = {int(tag_id) for tag_id in self.initial_data['tags']}
+        except KeyError:
+            tag_ids = set()
+        except (TypeError, ValueError):
+            raise ValidationError(detail={'tags': ['Укажите id тэгов']})
+        if Tag.objects.filter(id__in=tag_ids).count() != len(tag_ids):
+            raise ValidationError(
+                detail={'tags': ['Такого тэга не существует :(']}
+            )
+
+        data['ingredients'] = amounts
+        return data
+
+    def validate_amounts(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError(
                 {'error': 'Необходим хотя бы 1 ингредиент'}
             )
-        ingredient_list = []
-        for ingredient_item in ingredients:
-            ingredient = get_object_or_404(
-                Ingredient, id=ingredient_item['id']
+        try:
+            amounts = {
+                int(item['id']): int(item['amount']) for item in ingredients
+            }
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                detail={'ingredients': ['Укажите id и количество ингредиента']}
             )
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    'Ингридиенты должны быть уникальными'
-                )
-            ingredient_list.append(ingredient)
-
-        data['ingredients'] = ingredients
-        return data
+        if len(amounts) != len(ingredients):
+            raise serializers.ValidationError(
+                'Ингридиенты должны быть уникальными'
+            )
+        if min(amounts.values()) < 1:
+            raise ValidationError(
+                detail={
+                    'ingredients': ['Минимальное количество ингредиентов - 1']
+                }
+            )
+        if max(amounts.values()) > MAX_AMOUNT:
+            raise ValidationError(
+                detail={
+                    'ingredients': [
+                        f'Максимальное количество ингредиентов - {MAX_AMOUNT}'
+                    ]
+                }
+            )
+        return amounts
 
+    @transaction.atomic
     def create(self, validated_data):
-
-        ingredients_data = validated_data.pop('ingredients')
-        tag_ids = Tag.objects.all().values_list('id', flat=True)
-        tag_id = self.context.get('request').data['tags']
-
-        for id in tag_id:
-            if id not in tag_ids:
-                raise ValidationError(
-                    detail={'tags': ['Такого тэга не существует :(']}
-                )
-
+        amounts = validated_data.pop('ingredients')
         recipe = super(RecipeSerializer, self).create(validated_data)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+        )
+        return recipe
 
-        for ingredient in ingredients_data:
-            try:
-                get_ingredient = Ingredient.objects.get(id=ingredient['id'])
-                IngredientInRecipe.objects.update_or_create(
-                    recipe=recipe,
-                    ingredient=get_ingredient,
-                    amount=ingredient['amount'],
-                )
-            except Ingredient.DoesNotExist:
-                raise ValidationError(
-                    detail={
-                        'ingredients': ['Такого ингредиента не существует :(']
-                    }
-                )
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        amounts = validated_data.pop('ingredients')
+        recipe = super(RecipeSerializer, self).update(instance, validated_data)
 
+        current = {
+            row.ingredient_id: row for row in recipe.ingredient_in_recipe.all()
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id in current.keys() & amounts.keys():
+            row = current[ingredient_id]
+            if row.amount != amounts[ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
         return recipe
 
 
 class FollowSerializer(serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         fields = (
@@ -164,24 +286,19 @@ class FollowSerializer(serializers.ModelSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(
-            author_id=obj.id, user_id=user.id
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        return obj.id in get_request_membership(request).follow
 
     def get_recipes(self, obj):
-        try:
-            count = int(self.context.GET['recipes_limit'])
-            recipes = (
-                Recipe.objects.filter(author_id=obj.id)
-                .all()
-                .prefetch_related(count)
-            )
-        except AttributeError:
-            recipes = Recipe.objects.filter(author_id=obj.id).all()
-        return FavoriteSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author_id=obj.id).count()
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = obj.recipes.all()
+            limit = get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
+        return FavoriteSerializer(
+            recipes, many=True, context=self.context
+        ).data
@@ -0,0 +1,192 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipe.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from users.models import Follow, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_WORKERS=0)
+class QueryCountTests(TransactionTestCase):
+    """The recipe endpoints run a fixed number of queries, whatever the
+    page size or the number of ingredients.
+
+    A TransactionTestCase, so the on-commit version bumps, pantry log and
+    search refreshes run and are counted too.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_data(self):
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        self.tags = [
+            Tag.objects.create(name=f'Тэг {i}', color=color, slug=f't{i}')
+            for i, color in enumerate(['#49B64E', '#E26C2D'])
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(30)
+        )
+        self.ingredients = list(Ingredient.objects.order_by('id'))
+        for i in range(10):
+            recipe = Recipe.objects.create(
+                author=self.author if i % 2 else self.user,
+                name=f'Рецепт {i}',
+                text='Описание',
+                image='recipes/images/recipe.png',
+                cooking_time=10,
+            )
+            recipe.tags.set(self.tags[: i % 2 + 1])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1
+                )
+                for ingredient in self.ingredients[i: i + 3]
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def count_queries(self, method, *args, **kwargs):
+        """Response and query count of a request. Tests make a warm-up
+        request first: it creates version rows and fills the caches."""
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(*args, **kwargs)
+        return response, len(context)
+
+    def recipe_data(self, ingredients):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': image_data(),
+            'tags': [self.tags[0].id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 2}
+                for ingredient in ingredients
+            ],
+        }
+
+    def test_recipe_page_does_not_grow_with_page_size(self):
+        self.client.get('/api/recipes/', {'limit': 1})
+        response, queries = self.count_queries(
+            'get', '/api/recipes/', {'limit': 1}
+        )
+        self.assertEqual(len(response.data['results']), 1)
+        with self.assertNumQueries(queries):
+            response = self.client.get('/api/recipes/', {'limit': 10})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_recipe_create_does_not_grow_with_ingredients(self):
+        self.client.post(
+            '/api/recipes/',
+            self.recipe_data(self.ingredients[:1]),
+            format='json',
+        )
+        response, queries = self.count_queries(
+            'post',
+            '/api/recipes/',
+            self.recipe_data(self.ingredients[:3]),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        with self.assertNumQueries(queries):
+            response = self.client.post(
+                '/api/recipes/',
+                self.recipe_data(self.ingredients),
+                format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['ingredients']), 30)
+
+    def create_recipe(self, ingredients):
+        return self.client.post(
+            '/api/recipes/', self.recipe_data(ingredients), format='json'
+        ).data['id']
+
+    def test_recipe_update_does_not_grow_with_ingredients(self):
+        url = f'/api/recipes/{self.create_recipe(self.ingredients[:3])}/'
+        response, queries = self.count_queries(
+            'put', url, self.recipe_data(self.ingredients[:4]), format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(queries):
+            response = self.client.put(
+                url, self.recipe_data(self.ingredients), format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 30)
+
+    def test_recipe_shrink_does_not_grow_with_ingredients(self):
+        self.create_recipe(self.ingredients[:1])
+        url = f'/api/recipes/{self.create_recipe(self.ingredients[:3])}/'
+        response, queries = self.count_queries(
+            'put', url, self.recipe_data(self.ingredients[:1]), format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        url = f'/api/recipes/{self.create_recipe(self.ingredients)}/'
+        with self.assertNumQueries(queries):
+            response = self.client.put(
+                url, self.recipe_data(self.ingredients[:1]), format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ingredients']), 1)
+
+    def test_recipe_delete_does_not_grow_with_ingredients(self):
+        self.client.delete(
+            f'/api/recipes/{self.create_recipe(self.ingredients[:1])}/'
+        )
+        url = f'/api/recipes/{self.create_recipe(self.ingredients[:3])}/'
+        response, queries = self.count_queries('delete', url)
+        self.assertEqual(response.status_code, 204)
+        url = f'/api/recipes/{self.create_recipe(self.ingredients)}/'
+        with self.assertNumQueries(queries):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+
+    def test_recipe_rejects_malformed_tags_and_amounts(self):
+        data = self.recipe_data(self.ingredients[:1])
+        data['tags'] = ['завтрак']
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        data = self.recipe_data(self.ingredients[:1])
+        data['ingredients'][0]['amount'] = 32768
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -1,47 +1,141 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (
+    AllowAny,
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
 from rest_framework.response import Response
 
+from api.conditional import recipe_etag
 from api.filters import IngredientFilter, RecipeFilter
-from api.paginations import PagePagination
+from api.paginations import RecipePagination
+from api.pantry import pantry_index
 from api.permissions import IsAuthor
+from api.reference import ingredients, tags
+from api.search import ingredient_index
 from api.serializers import (
+    ExportJobSerializer,
     FavoriteSerializer,
     IngredientSerializer,
+    PantryMatchSerializer,
+    PantrySerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     TagSerializer,
 )
-from recipe.models import Favorite, Ingredient, IngredientInRecipe, Recipe, Tag
-from utils.to_pdf import get_pdf
+from recipe.catalog import export_catalog
+from recipe.exports import enqueue_export, open_export
+from recipe.favorites import (
+    FAVORITE,
+    SHOPPING_CART,
+    add_to_list,
+    remove_from_list,
+    shopping_cart_ingredients,
+)
+from recipe.models import (
+    ExportJob,
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    Tag,
+)
+from utils.replicas import primary
+from utils.shopping_list import FILE_NAME, RENDERERS, get_shopping_list
 
 User = get_user_model()
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class ReferenceDataMixin:
+    """Serve list and retrieve from a pre-serialized reference snapshot."""
+
+    reference = None
+
+    def list(self, request, *args, **kwargs):
+        snapshot = self.reference.get()
+        if request.accepted_renderer.format == 'json':
+            return HttpResponse(
+                snapshot.content, content_type='application/json'
+            )
+        return Response(snapshot.items)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            item = self.reference.get().by_id[int(lookup)]
+        except (KeyError, ValueError):
+            raise NotFound
+        return Response(item)
+
+
+class IngredientViewSet(ReferenceDataMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
+    reference = ingredients
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
 
-class TagViewSet(viewsets.ModelViewSet):
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if settings.INGREDIENT_SEARCH_BACKEND == 'memory':
+            return Response(ingredient_index.search(name, limit))
+
+        queryset = self.filter_queryset(self.get_queryset())[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+class TagViewSet(ReferenceDataMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    reference = tags
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthor]
-    pagination_class = PagePagination
+    pagination_class = RecipePagination
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return (
+            Recipe.objects.select_related('author')
+            .prefetch_related(
+                'tags',
+                Prefetch(
+                    'ingredient_in_recipe',
+                    queryset=IngredientInRecipe.objects.select_related(
+                        'ingredient'
+                    ),
+                ),
+            )
+            .defer('search_vector')
+        )
+
+    @method_decorator(primary())
+    @method_decorator(condition(etag_func=recipe_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(primary())
+    @method_decorator(condition(etag_func=recipe_etag))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(
         methods=['POST', 'DELETE'],
         detail=False,
@@ -49,13 +143,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='(?P<id>[0-9]+)/favorite',
     )
     def favorite(self, request, id):
-        _recipe = get_object_or_404(Recipe, id=id)
+        recipe = get_object_or_404(Recipe, id=id)
 
         if request.method == 'POST':
-            recipe = Favorite.objects.get_or_create(
-                recipe_id=id, user_id=self.request.user.id
-            )[0]
-            if recipe.favorite:
+            if not add_to_list(request.user, [recipe.id], FAVORITE):
                 raise ValidationError(
                     detail={
                         'error': [
@@ -63,27 +154,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
                         ]
                     }
                 )
-            else:
-                recipe.favorite = True
-                recipe.save()
-            serializer = FavoriteSerializer(_recipe)
+            serializer = FavoriteSerializer(recipe)
             return Response(serializer.data)
 
-        if request.method == 'DELETE':
-            recipe = Favorite.objects.get(
-                recipe_id=id, user_id=self.request.user.id
+        if not remove_from_list(request.user, [recipe.id], FAVORITE):
+            raise ValidationError(
+                detail={'error': ['Рецепта нет в вашем списке избранного']}
             )
-            if recipe.favorite is False:
-                raise ValidationError(
-                    detail={'error': ['Рецепта нет в вашем списке избранного']}
-                )
-            else:
-                recipe.favorite = False
-                recipe.save()
-                return Response(
-                    {'status': 'Рецепт удален из избранного'},
-                    status=status.HTTP_200_OK,
-                )
+        return Response(
+            {'status': 'Рецепт удален из избранного'},
+            status=status.HTTP_200_OK,
+        )
 
     @action(
         methods=['POST', 'DELETE'],
@@ -92,39 +173,81 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='(?P<id>[0-9]+)/shopping_cart',
     )
     def shopping_cart(self, request, id):
-        _recipe = get_object_or_404(Recipe, id=id)
+        recipe = get_object_or_404(Recipe, id=id)
 
         if request.method == 'POST':
-            recipe = Favorite.objects.get_or_create(
-                recipe_id=id, user_id=self.request.user.id
-            )[0]
-            if recipe.shopping_cart is True:
+            if not add_to_list(request.user, [recipe.id], SHOPPING_CART):
                 raise ValidationError(
                     detail={
                         'error': ['Вы уже добавили рецепт в список покупок.']
                     }
                 )
-            else:
-                recipe.shopping_cart = True
-                recipe.save()
-            serializer = FavoriteSerializer(_recipe)
+            serializer = FavoriteSerializer(recipe)
             return Response(serializer.data)
 
-        if request.method == 'DELETE':
-            recipe = Favorite.objects.get(
-                recipe_id=id, user_id=self.request.user.id
+        if not remove_from_list(request.user, [recipe.id], SHOPPING_CART):
+            raise ValidationError(
+                detail={'error': ['Рецепт не добавлен в список покупок']}
             )
-            if recipe.shopping_cart is False:
-                raise ValidationError(
-                    detail={'error': ['Рецепт не добавлен в список покупок']}
-                )
-            else:
-                recipe.shopping_cart = False
-                recipe.save()
-                return Response(
-                    {'status': 'Рецепт удален из списка покупок'},
-                    status=status.HTTP_200_OK,
-                )
+        return Response(
+            {'status': 'Рецепт удален из списка покупок'},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/batch',
+    )
+    def shopping_cart_batch(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+
+        if request.method == 'POST':
+            added = add_to_list(request.user, recipe_ids, SHOPPING_CART)
+            return Response({'added': added}, status=status.HTTP_200_OK)
+
+        removed = remove_from_list(request.user, recipe_ids, SHOPPING_CART)
+        return Response({'removed': removed}, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, permission_classes=[AllowAny])
+    def pantry(self, request):
+        """Recipes best covered by the ingredients the user has on hand."""
+        serializer = PantrySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        matches = pantry_index.match(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['limit'],
+        )
+        recipes = Recipe.objects.defer('search_vector').in_bulk(
+            [match.recipe_id for match in matches]
+        )
+        results = []
+        for match in matches:
+            recipe = recipes.get(match.recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = match.coverage
+            recipe.missing = match.missing
+            results.append(recipe)
+        serializer = PantryMatchSerializer(
+            results, many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False, permission_classes=[IsAdminUser])
+    def catalog(self, request):
+        """The whole catalog as NDJSON, streamed chunk by chunk."""
+        response = StreamingHttpResponse(
+            export_catalog(settings.CATALOG_CHUNK_SIZE),
+            content_type='application/x-ndjson; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="catalog.ndjson"'
+        )
+        return response
 
     @action(
         methods=['GET'],
@@ -133,38 +256,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='download_shopping_cart',
     )
     def get_shopping_cart(self, request):
-        data = dict()
-        recipes = Recipe.objects.filter(
-            favorite__user=self.request.user, favorite__shopping_cart=True
-        ).all()
-        if not recipes:
+        file_format = self.get_file_format(request)
+        ingredients = shopping_cart_ingredients(request.user.id)
+        if not ingredients:
+            raise ValidationError(
+                detail={'error': ['Ваш список покупок пуст :(']}
+            )
+
+        return get_shopping_list(ingredients, file_format)
+
+    @action(
+        methods=['POST'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path='download_shopping_cart/export',
+    )
+    def export_shopping_cart(self, request):
+        """Queue the list for run_export_worker instead of rendering it."""
+        file_format = self.get_file_format(request)
+        if not Favorite.objects.filter(
+            user=request.user, shopping_cart=True
+        ).exists():
             raise ValidationError(
                 detail={'error': ['Ваш список покупок пуст :(']}
             )
+        job = enqueue_export(request.user, file_format)
+        serializer = ExportJobSerializer(job, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-        for recipe in recipes:
-            ingredients = IngredientInRecipe.objects.filter(
-                recipe=recipe
-            ).all()
-            for ingredient in ingredients:
-                if f'{ingredient.ingredient.id}' in data:
-                    data[f'{ingredient.ingredient.id}'][
-                        'amount'
-                    ] += ingredient.amount
-                else:
-                    data.update(
-                        {
-                            f'{ingredient.ingredient.id}': {
-                                'name': ingredient.ingredient.name,
-                                'measurement_unit':
-                                    ingredient.ingredient.measurement_unit,
-                                'amount': ingredient.amount,
-                            }
-                        }
-                    )
-
-        data = dict(sorted(data.items(), key=lambda item: item[1]['name']))
-        return get_pdf(data)
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path=r'download_shopping_cart/export/(?P<job_id>\d+)',
+    )
+    def export_shopping_cart_status(self, request, job_id):
+        job = get_object_or_404(ExportJob, id=job_id, user=request.user)
+        serializer = ExportJobSerializer(job, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        url_path=r'download_shopping_cart/export/(?P<job_id>\d+)/file',
+    )
+    def export_shopping_cart_file(self, request, job_id):
+        job = get_object_or_404(ExportJob, id=job_id, user=request.user)
+        file = open_export(job)
+        if file is None:
+            raise NotFound('Файл ещё не готов или уже удалён')
+        _, content_type = RENDERERS[job.file_format]
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=f'{FILE_NAME}.{job.file_format}',
+            content_type=content_type,
+        )
+
+    def get_file_format(self, request):
+        file_format = request.query_params.get('type', 'pdf')
+        if file_format not in RENDERERS:
+            raise ValidationError(
+                detail={'type': [f'Доступные форматы: {", ".join(RENDERERS)}']}
+            )
+        return file_format
 
     def perform_create(self, serializer):
         if 'tags' not in self.request.data:
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.metrics.MetricsMiddleware',
+    'utils.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +75,29 @@ DATABASES = {
     }
 }
 
+# Read replicas: DB_REPLICAS lists their hosts, or database files for
+# SQLite, comma-separated. Safe-method requests, except the recipe list
+# and detail whose ETags come from the primary, read from a replica at
+# most REPLICA_MAX_LAG seconds behind, measured every
+# REPLICA_LAG_CHECK_INTERVAL seconds; a client that wrote reads from the
+# primary for the next REPLICA_PIN_SECONDS.
+REPLICA_DATABASES = []
+for number, location in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(',')), 1
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['NAME'] = location
+    else:
+        DATABASES[alias]['HOST'] = location
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['utils.replicas.ReplicaRouter']
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', default=2))
+REPLICA_LAG_CHECK_INTERVAL = 1
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=5))
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -119,6 +144,24 @@ DJOSER = {
     }
 }
 
+# Caches. Version counters live in the database (recipe.Version), so
+# invalidation reaches every worker with any backend here. A shared
+# CACHE_BACKEND additionally lets workers share membership sets and the
+# change log the in-process indexes replay; read replicas require one.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+MEMBERSHIP_CACHE = 'default'
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+
 # Internationalization
 
 LANGUAGE_CODE = 'en-us'
@@ -138,3 +181,65 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Per-view metrics served at /internal/metrics/ to these addresses and to
+# staff; requests slower than SLOW_REQUEST_THRESHOLD seconds are logged
+# with their most repeated SQL statements (0 turns the log off).
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', default='127.0.0.1'
+).split(',')
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', default=1))
+SLOW_REQUEST_TOP_QUERIES = 5
+
+# Recipe image derivatives, generated in a background thread pool after
+# upload. Sizes are bounding boxes; IMAGE_WORKERS=0 turns generation off.
+IMAGE_DERIVATIVES = {
+    'thumbnail': (240, 240),
+    'card': (640, 640),
+    'full': (1600, 1600),
+}
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+SHOPPING_LIST_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'shopping_lists')
+# Rendered shopping lists kept on disk, least recently used go first.
+SHOPPING_LIST_CACHE_MAX_FILES = int(
+    os.getenv('SHOPPING_LIST_CACHE_MAX_FILES', default=1000)
+)
+# Shopping lists rendered at the same time per process; the rest queue.
+SHOPPING_LIST_RENDER_WORKERS = int(
+    os.getenv('SHOPPING_LIST_RENDER_WORKERS', default=2)
+)
+# Background exports (run_export_worker), all in seconds: how long jobs
+# and rendered files are kept, when a running job counts as abandoned,
+# how often an idle worker polls and cleans up.
+EXPORT_JOB_TTL = 24 * 60 * 60
+EXPORT_JOB_TIMEOUT = 5 * 60
+EXPORT_WORKER_POLL_INTERVAL = 1
+EXPORT_CLEANUP_INTERVAL = 60
+
+# Ingredient autocomplete: 'memory' serves it from an in-process index,
+# 'database' from the upper-case pattern index on Ingredient.name.
+INGREDIENT_SEARCH_BACKEND = os.getenv(
+    'INGREDIENT_SEARCH_BACKEND', default='memory'
+)
+INGREDIENT_SEARCH_LIMIT = 20
+
+# Recipe search: PostgreSQL text search configuration for the indexed
+# search_vector, and how many matches the in-process fallback returns.
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+RECIPE_SEARCH_LIMIT = 500
+
+# "What can I cook": the most pantry ingredients and results per request,
+# and how many logged recipe changes the in-process index replays before
+# it reloads from the database instead.
+PANTRY_MAX_INGREDIENTS = 500
+PANTRY_LIMIT = 50
+PANTRY_REPLAY_LIMIT = 1000
+
+# Recipes fetched per query by the NDJSON catalog export, in the staff
+# endpoint and export_catalog.
+CATALOG_CHUNK_SIZE = 500
+
+# How often, in seconds, a worker checks the shared tag and ingredient
+# versions before reusing its in-process snapshot.
+REFERENCE_DATA_CHECK_INTERVAL = 1
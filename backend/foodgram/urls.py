@@ -3,8 +3,11 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from utils.metrics import METRICS_VIEW, metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('internal/metrics/', metrics, name=METRICS_VIEW),
     path('api/', include('users.urls', namespace='api_users')),
     path('api/', include('api.urls', namespace='api'))
 ]
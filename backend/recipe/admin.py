@@ -1,26 +1,37 @@
 from django.contrib import admin
 
+from api.search import search_recipes
 from users.models import Follow
+from utils.admin import LargeTableAdmin
 
-from .models import Favorite, Ingredient, IngredientInRecipe, Recipe, Tag
+from .models import (
+    ExportJob,
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    Tag,
+)
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('pk', 'name', 'measurement_unit')
     search_fields = ('name',)
 
 
 @admin.register(IngredientInRecipe)
-class IngredientInRecipeAdmin(admin.ModelAdmin):
+class IngredientInRecipeAdmin(LargeTableAdmin):
     autocomplete_fields = ('recipe', 'ingredient')
-    list_display = ('amount',)
+    list_display = ('pk', 'recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
     list_filter = ('ingredient',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     fields = ('author', 'name', 'text', 'tags', 'image', 'cooking_time')
+    autocomplete_fields = ('author',)
     list_display = (
         'pk',
         'name',
@@ -28,13 +39,20 @@ class RecipeAdmin(admin.ModelAdmin):
         'image',
         'cooking_time',
         'author',
-        'favorites',
+        'favorites_count',
     )
+    list_select_related = ('author',)
     search_fields = ('name',)
 
-    @staticmethod
-    def favorites(obj):
-        return obj.favorite.filter(favorite=True).count()
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('search_vector')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Full-text search over the indexed search_vector."""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
 
 
 @admin.register(Tag)
@@ -45,11 +63,21 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
+    autocomplete_fields = ('author', 'user')
     list_display = ('pk', 'author', 'user')
+    list_select_related = ('author', 'user')
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
-    autocomplete_fields = ('recipe',)
-    list_display = ('pk', 'user', 'shopping_cart', 'favorite')
+class FavoriteAdmin(LargeTableAdmin):
+    autocomplete_fields = ('user', 'recipe')
+    list_display = ('pk', 'user', 'recipe', 'shopping_cart', 'favorite')
+    list_select_related = ('user', 'recipe')
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(LargeTableAdmin):
+    list_display = ('pk', 'user', 'file_format', 'status', 'created')
+    list_select_related = ('user',)
+    list_filter = ('status',)
@@ -0,0 +1,115 @@
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import BinaryIO, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from recipe.favorites import shopping_cart_ingredients
+from recipe.models import ExportJob
+from utils.shopping_list import get_rows, open_cached, open_shopping_list
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = (ExportJob.PENDING, ExportJob.RUNNING)
+
+
+def enqueue_export(user, file_format: str) -> ExportJob:
+    """Queue an export, or return the user's job for it already queued.
+
+    unique_active_export_job keeps one pending or running job per user
+    and format, so repeated clicks share a single job.
+    """
+    active = ExportJob.objects.filter(
+        user=user, file_format=file_format, status__in=ACTIVE
+    )
+    job = active.first()
+    if job is not None:
+        return job
+    try:
+        with transaction.atomic():
+            return ExportJob.objects.create(user=user, file_format=file_format)
+    except IntegrityError:
+        return active.get()
+
+
+def claim_job() -> Optional[ExportJob]:
+    """Mark the oldest pending job running and return it.
+
+    FOR UPDATE SKIP LOCKED lets several workers poll the queue without
+    handing out the same job or waiting on each other's row locks.
+    """
+    with transaction.atomic():
+        job = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ExportJob.PENDING)
+            .order_by('created')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ExportJob.RUNNING
+        job.started = timezone.now()
+        job.save(update_fields=['status', 'started'])
+    return job
+
+
+def run_job(job: ExportJob) -> None:
+    """Render the user's current cart and record the file name.
+
+    Files are shared by every identical cart, see open_shopping_list;
+    reusing one refreshes its mtime so expire_exports keeps it.
+    """
+    try:
+        rows = get_rows(shopping_cart_ingredients(job.user_id))
+        if rows:
+            with open_shopping_list(rows, job.file_format) as file:
+                job.file_name = os.path.basename(file.name)
+            job.status = ExportJob.DONE
+        else:
+            job.status = ExportJob.FAILED
+            job.error = 'Ваш список покупок пуст'
+    except Exception as error:
+        logger.exception('Не удалось выгрузить список покупок %s', job.id)
+        job.status = ExportJob.FAILED
+        job.error = str(error)
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'error', 'file_name', 'finished'])
+
+
+def open_export(job: ExportJob) -> Optional[BinaryIO]:
+    """The rendered file of a finished job, None if not ready or gone."""
+    if job.status != ExportJob.DONE:
+        return None
+    return open_cached(
+        os.path.join(settings.SHOPPING_LIST_CACHE_DIR, job.file_name)
+    )
+
+
+def requeue_stale_jobs() -> int:
+    """Return jobs of workers that died mid-render to the queue."""
+    started = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+    return ExportJob.objects.filter(
+        status=ExportJob.RUNNING, started__lt=started
+    ).update(status=ExportJob.PENDING, started=None)
+
+
+def expire_exports() -> int:
+    """Delete finished jobs and rendered files older than EXPORT_JOB_TTL."""
+    now = time.time()
+    finished = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TTL)
+    deleted, _ = ExportJob.objects.filter(finished__lt=finished).delete()
+    cache_dir = settings.SHOPPING_LIST_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return deleted
+    with os.scandir(cache_dir) as entries:
+        for entry in entries:
+            if now - entry.stat().st_mtime > settings.EXPORT_JOB_TTL:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+    return deleted
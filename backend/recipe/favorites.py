@@ -0,0 +1,104 @@
+from typing import Iterable, List
+
+from django.db import connection, transaction
+from django.db.models import F, QuerySet, Sum
+
+from recipe.models import Favorite, IngredientInRecipe, Recipe
+from recipe.signals import POPULARITY_VERSION
+from users.membership import record
+from utils.counters import change_counter
+from utils.versions import bump_on_commit
+
+FAVORITE = 'favorite'
+SHOPPING_CART = 'shopping_cart'
+
+COUNTERS = {FAVORITE: 'favorites_count', SHOPPING_CART: 'cart_count'}
+
+
+def shopping_cart_ingredients(user_id: int) -> QuerySet:
+    """Ingredients of the user's cart summed per ingredient, by name."""
+    return (
+        IngredientInRecipe.objects.filter(
+            recipe__favorite__user_id=user_id,
+            recipe__favorite__shopping_cart=True,
+        )
+        .values(
+            'ingredient',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        )
+        .annotate(amount=Sum('amount'))
+        .order_by('name')
+    )
+
+
+def changed(user, recipe_ids: List[int], flag: str, delta: int) -> None:
+    change_counter(Recipe, recipe_ids, COUNTERS[flag], delta)
+    record(user.id, flag, recipe_ids, added=delta > 0)
+    bump_on_commit(POPULARITY_VERSION)
+
+
+@transaction.atomic
+def add_to_list(user, recipe_ids: Iterable[int], flag: str) -> int:
+    """Set ``flag`` on the user's Favorite rows for existing recipe_ids.
+
+    One INSERT ... ON CONFLICT against unique_favorite inserts missing
+    rows and switches the flag on rows where it is unset; RETURNING
+    tells which recipes' counters to increment. Returns how many recipes
+    were actually added.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+    quote_name = connection.ops.quote_name
+    favorite_table = quote_name(Favorite._meta.db_table)
+    recipe_table = quote_name(Recipe._meta.db_table)
+    column = quote_name(flag)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {favorite_table} '
+            '(user_id, recipe_id, favorite, shopping_cart) '
+            f'SELECT %s, {recipe_table}.id, %s, %s FROM {recipe_table} '
+            f'WHERE {recipe_table}.id IN ({placeholders}) '
+            'ON CONFLICT (user_id, recipe_id) '
+            f'DO UPDATE SET {column} = %s '
+            f'WHERE {favorite_table}.{column} = %s '
+            'RETURNING recipe_id',
+            [
+                user.id,
+                flag == FAVORITE,
+                flag == SHOPPING_CART,
+                *recipe_ids,
+                True,
+                False,
+            ],
+        )
+        added = [row[0] for row in cursor.fetchall()]
+    if added:
+        changed(user, added, flag, 1)
+    return len(added)
+
+
+@transaction.atomic
+def remove_from_list(user, recipe_ids: Iterable[int], flag: str) -> int:
+    """Clear ``flag`` with one conditional UPDATE, return rows changed."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+    quote_name = connection.ops.quote_name
+    favorite_table = quote_name(Favorite._meta.db_table)
+    column = quote_name(flag)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {favorite_table} SET {column} = %s '
+            f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+            f'AND {column} = %s '
+            'RETURNING recipe_id',
+            [False, user.id, *recipe_ids, True],
+        )
+        removed = [row[0] for row in cursor.fetchall()]
+    if removed:
+        changed(user, removed, flag, -1)
+    return len(removed)
@@ -0,0 +1,42 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db.backends.ddl_references import Statement, Table
+from django.db.models import Index
+
+
+class SearchVectorIndex(GinIndex):
+    """GIN index on PostgreSQL and a plain index everywhere else.
+
+    Keeps the schema creatable on SQLite, where recipe search is served
+    by the in-process index from api.search instead.
+    """
+
+    def create_sql(self, model, schema_editor, using=''):
+        if schema_editor.connection.vendor != 'postgresql':
+            return Index.create_sql(self, model, schema_editor, using)
+        return super().create_sql(model, schema_editor, using)
+
+
+class UpperPatternIndex(Index):
+    """Index for case-insensitive prefix search with ``__istartswith``.
+
+    Django 2.2 has no functional indexes. On PostgreSQL this indexes the
+    exact expression the lookup compares, ``UPPER(field::text)``, with
+    text_pattern_ops so LIKE 'prefix%' can use it; elsewhere it is a plain
+    index.
+    """
+
+    def create_sql(self, model, schema_editor, using=''):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().create_sql(model, schema_editor, using)
+        quote_name = schema_editor.quote_name
+        columns = ', '.join(
+            f'(UPPER({quote_name(model._meta.get_field(name).column)}::text))'
+            ' text_pattern_ops'
+            for name in self.fields
+        )
+        return Statement(
+            'CREATE INDEX %(name)s ON %(table)s (%(columns)s)',
+            name=quote_name(self.name),
+            table=Table(model._meta.db_table, quote_name),
+            columns=columns,
+        )
@@ -1,8 +1,10 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
 from foodgram import settings
+from recipe.indexes import SearchVectorIndex, UpperPatternIndex
 
 
 class Tag(models.Model):
@@ -39,6 +41,11 @@ class Ingredient(models.Model):
             models.UniqueConstraint(fields=['name', 'measurement_unit'],
                                     name='unique ingredient')
         ]
+        indexes = [
+            UpperPatternIndex(
+                fields=['name'], name='ingredient_name_upper_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -58,6 +65,12 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Изображение', upload_to='recipes/images/'
     )
+    derivatives_of = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии готовы для',
+    )
     tags = models.ManyToManyField(Tag, related_name='recipes')
     ingredients = models.ManyToManyField(
         Ingredient, through='IngredientInRecipe', related_name='recipes'
@@ -74,11 +87,31 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата создания', auto_now_add=True, db_index=True
     )
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В списках покупок'
+    )
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+            SearchVectorIndex(
+                fields=['search_vector'], name='recipe_search_vector_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_popular_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -108,6 +141,18 @@ class IngredientInRecipe(models.Model):
         ordering = ['-id']
         verbose_name = 'Добавить ингредиент в рецепт'
         verbose_name_plural = 'Добавить ингредиент в рецепт'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_ingredient_in_recipe',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='ingredient_in_recipe_cover_idx',
+            )
+        ]
 
     def __str__(self):
         return f'{self.ingredient.name}, {self.recipe.name}'
@@ -135,3 +180,92 @@ class Favorite(models.Model):
         ordering = ['-id']
         verbose_name = 'Добавить рецепт в избранное/список покупок'
         verbose_name_plural = 'Добавить рецепт в избранное/список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_favorite'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user'],
+                name='favorite_user_favorite_idx',
+                condition=models.Q(favorite=True),
+            ),
+            models.Index(
+                fields=['user'],
+                name='favorite_user_cart_idx',
+                condition=models.Q(shopping_cart=True),
+            ),
+        ]
+
+
+class Version(models.Model):
+    """Shared version counter of cached data, see utils.versions."""
+
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(verbose_name='Версия')
+    modified = models.DateTimeField(null=True, verbose_name='Изменена')
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}={self.value}'
+
+
+class ExportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='export_jobs',
+    )
+    file_format = models.CharField(max_length=10, verbose_name='Формат')
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    file_name = models.CharField(
+        max_length=100, blank=True, verbose_name='Файл'
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+    started = models.DateTimeField(null=True, verbose_name='Начат')
+    finished = models.DateTimeField(null=True, verbose_name='Завершён')
+
+    class Meta:
+        ordering = ['-id']
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'file_format'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_export_job',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['created'],
+                name='export_job_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+            models.Index(fields=['finished'], name='export_job_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}, {self.file_format}, {self.status}'
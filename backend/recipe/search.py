@@ -0,0 +1,59 @@
+from typing import Set
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import connections, router, transaction
+from django.db.models import OuterRef, QuerySet, Subquery, TextField
+
+from recipe.models import IngredientInRecipe, Recipe
+from utils.transactions import on_commit_once
+
+
+def search_vector() -> SearchVector:
+    """Name, ingredient names and text weighted A, B and C."""
+    config = settings.RECIPE_SEARCH_CONFIG
+    names = (
+        IngredientInRecipe.objects.filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(
+            Subquery(names, output_field=TextField()),
+            weight='B',
+            config=config,
+        )
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def uses_search_vector() -> bool:
+    return connections[router.db_for_write(Recipe)].vendor == 'postgresql'
+
+
+def refresh_search_vectors(recipes: QuerySet) -> int:
+    """Recompute Recipe.search_vector in one UPDATE, return rows changed."""
+    if not uses_search_vector():
+        return 0
+    return recipes.update(search_vector=search_vector())
+
+
+def refresh_on_commit(recipes: QuerySet) -> None:
+    """Refresh once the transaction commits and ingredient rows are final."""
+    if uses_search_vector():
+        transaction.on_commit(lambda: refresh_search_vectors(recipes))
+
+
+def refresh_recipes(recipe_ids: Set[int]) -> int:
+    return refresh_search_vectors(Recipe.objects.filter(id__in=recipe_ids))
+
+
+def refresh_recipe_on_commit(recipe_id: int) -> None:
+    """``refresh_on_commit`` for one recipe; all recipes changed in a
+    transaction are refreshed by a single UPDATE."""
+    if uses_search_vector():
+        on_commit_once(refresh_recipes, recipe_id)
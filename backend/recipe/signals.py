@@ -0,0 +1,86 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipe.models import Favorite, Ingredient, IngredientInRecipe, Recipe, Tag
+from recipe.search import refresh_on_commit, refresh_recipe_on_commit
+from users.models import User
+from utils import images
+from utils.counters import change_counter
+from utils.versions import bump_on_commit, log_change_on_commit, user_version
+
+INGREDIENTS_VERSION = 'ingredients'
+PANTRY_VERSION = 'pantry'
+POPULARITY_VERSION = 'popularity'
+RECIPES_VERSION = 'recipes'
+TAGS_VERSION = 'tags'
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_on_commit(INGREDIENTS_VERSION, RECIPES_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tags_changed(**kwargs):
+    bump_on_commit(TAGS_VERSION, RECIPES_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+def recipes_changed(**kwargs):
+    bump_on_commit(RECIPES_VERSION)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(action, **kwargs):
+    if action.startswith('post_'):
+        bump_on_commit(RECIPES_VERSION)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        change_counter(User, [instance.author_id], 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    change_counter(User, [instance.author_id], 'recipes_count', -1)
+    bump_on_commit(POPULARITY_VERSION)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    if instance.image and instance.derivatives_of != instance.image.name:
+        images.schedule(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_text_changed(instance, **kwargs):
+    refresh_recipe_on_commit(instance.id)
+
+
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+def recipe_ingredients_changed(instance, **kwargs):
+    refresh_recipe_on_commit(instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(instance, created, **kwargs):
+    if not created:
+        refresh_on_commit(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_composition_saved(instance, **kwargs):
+    log_change_on_commit(PANTRY_VERSION, instance.id)
+
+
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+def recipe_composition_changed(instance, **kwargs):
+    log_change_on_commit(PANTRY_VERSION, instance.recipe_id)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+def favorites_changed(instance, **kwargs):
+    bump_on_commit(user_version(instance.user_id))
@@ -0,0 +1,72 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipe.models import Favorite, Ingredient, IngredientInRecipe, Recipe
+from users.models import Follow, User
+
+
+class AdminChangelistTests(TestCase):
+    """Changelists of the large tables run a fixed number of queries,
+    however many rows are shown."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            user = User.objects.create_user(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            recipe = Recipe.objects.create(
+                author=user,
+                name=f'Рецепт {number}',
+                text='Описание',
+                image='recipes/images/recipe.png',
+                cooking_time=10,
+            )
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1
+            )
+            Favorite.objects.create(
+                user=self.admin, recipe=recipe, favorite=True
+            )
+            Follow.objects.create(user=self.admin, author=user)
+
+    def test_changelists_do_not_grow_with_rows(self):
+        urls = [
+            reverse(f'admin:{model._meta.app_label}_'
+                    f'{model._meta.model_name}_changelist')
+            for model in (Recipe, IngredientInRecipe, Favorite, Follow, User)
+        ]
+        self.add_rows(2)
+        counts = {}
+        for url in urls:
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(url)
+            counts[url] = len(context)
+        self.add_rows(20)
+        for url in urls:
+            with self.subTest(url=url), self.assertNumQueries(counts[url]):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
@@ -1,10 +1,12 @@
 from django.contrib import admin
 
+from utils.admin import LargeTableAdmin
+
 from .models import User
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     fields = [
         'email',
         'password',
@@ -20,5 +22,7 @@ class UserAdmin(admin.ModelAdmin):
         'password',
         'last_login',
         'date_joined',
+        'recipes_count',
+        'followers_count',
     )
-    search_fields = ['username']
+    search_fields = ['username', 'email']
@@ -0,0 +1,101 @@
+from typing import FrozenSet, Iterable, NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from recipe.models import Favorite
+from users.models import Follow
+from utils.replicas import primary
+from utils.versions import bump_version, get_version, user_version
+
+FAVORITE = 'favorite'
+SHOPPING_CART = 'shopping_cart'
+FOLLOW = 'follow'
+
+
+class Membership(NamedTuple):
+    favorite: FrozenSet[int]
+    shopping_cart: FrozenSet[int]
+    follow: FrozenSet[int]
+
+
+EMPTY = Membership(frozenset(), frozenset(), frozenset())
+
+
+def get_cache():
+    return caches[settings.MEMBERSHIP_CACHE]
+
+
+def get_key(user_id: int, version: int) -> str:
+    return f'membership:{user_id}:{version}'
+
+
+@primary()
+def load(user_id: int) -> Membership:
+    favorite, shopping_cart = set(), set()
+    rows = Favorite.objects.filter(user_id=user_id).values_list(
+        'recipe_id', 'favorite', 'shopping_cart'
+    )
+    for recipe_id, is_favorite, in_shopping_cart in rows:
+        if is_favorite:
+            favorite.add(recipe_id)
+        if in_shopping_cart:
+            shopping_cart.add(recipe_id)
+    follow = Follow.objects.filter(user_id=user_id).values_list(
+        'author_id', flat=True
+    )
+    return Membership(
+        frozenset(favorite), frozenset(shopping_cart), frozenset(follow)
+    )
+
+
+def get_membership(user) -> Membership:
+    """Favorite, cart and followed-author ids of ``user``.
+
+    Entries are keyed by the user's version, so any write that bumps it
+    makes the next read load a fresh copy unless ``record`` already
+    stored one.
+    """
+    if user.is_anonymous:
+        return EMPTY
+    key = get_key(user.id, get_version(user_version(user.id)))
+    membership = get_cache().get(key)
+    if membership is None:
+        membership = load(user.id)
+        get_cache().set(key, membership, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return membership
+
+
+def get_request_membership(request) -> Membership:
+    """``get_membership`` memoized for the lifetime of one request."""
+    membership = getattr(request, '_membership', None)
+    if membership is None:
+        membership = get_membership(request.user)
+        request._membership = membership
+    return membership
+
+
+def apply(user_id: int, kind: str, ids: FrozenSet[int], added: bool) -> None:
+    version = bump_version(user_version(user_id))
+    cache = get_cache()
+    previous = cache.get(get_key(user_id, version - 1))
+    if previous is None:
+        return
+    current = getattr(previous, kind)
+    current = current | ids if added else current - ids
+    cache.set(
+        get_key(user_id, version),
+        previous._replace(**{kind: current}),
+        settings.MEMBERSHIP_CACHE_TIMEOUT,
+    )
+
+
+def record(user_id: int, kind: str, ids: Iterable[int], added: bool) -> None:
+    """Bump the user's version on commit and carry the cached sets over.
+
+    The delta is only applied to the entry of the immediately preceding
+    version; if another write got in between, the next read reloads.
+    """
+    ids = frozenset(ids)
+    transaction.on_commit(lambda: apply(user_id, kind, ids, added))
@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from foodgram import settings
+from recipe.indexes import UpperPatternIndex
 
 
 class User(AbstractUser):
@@ -22,9 +23,21 @@ class User(AbstractUser):
         choices=USER_ROLES,
         default='user',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков'
+    )
 
     class Meta:
         ordering = ('username',)
+        indexes = [
+            UpperPatternIndex(
+                fields=['username'], name='user_username_upper_idx'
+            ),
+            UpperPatternIndex(fields=['email'], name='user_email_upper_idx'),
+        ]
 
     @property
     def is_admin(self):
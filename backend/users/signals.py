@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from recipe.signals import RECIPES_VERSION
+from users.membership import FOLLOW, record
+from users.models import Follow, User
+from utils.counters import change_counter
+from utils.versions import bump_on_commit, user_version
+
+# Fields of the author block rendered into every recipe; id never changes.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(instance, created, **kwargs):
+    if created:
+        change_counter(User, [instance.author_id], 'followers_count', 1)
+        record(instance.user_id, FOLLOW, [instance.author_id], added=True)
+    else:
+        bump_on_commit(user_version(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    change_counter(User, [instance.author_id], 'followers_count', -1)
+    record(instance.user_id, FOLLOW, [instance.author_id], added=False)
+
+
+@receiver(pre_save, sender=User)
+def check_author_fields(instance, update_fields=None, **kwargs):
+    """Compare the author fields with the stored row before an update.
+
+    Signup, logins, password and role changes do not touch the recipes,
+    so only a changed author block invalidates them.
+    """
+    instance._author_changed = False
+    if instance.pk is None or (
+        update_fields is not None
+        and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    saved = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*AUTHOR_FIELDS)
+        .first()
+    )
+    instance._author_changed = saved is not None and saved != tuple(
+        getattr(instance, field) for field in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, **kwargs):
+    if not created and getattr(instance, '_author_changed', False):
+        bump_on_commit(RECIPES_VERSION)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(**kwargs):
+    bump_on_commit(RECIPES_VERSION)
@@ -1,3 +1,4 @@
+from django.db.models import BooleanField, OuterRef, Prefetch, Subquery, Value
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -5,8 +6,9 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from api.paginations import PagePagination
-from api.serializers import FollowSerializer
+from api.paginations import UserPagination
+from api.serializers import FollowSerializer, get_recipes_limit
+from recipe.models import Recipe
 from users.models import Follow, User
 from users.serializers import CustomUserSerializer
 
@@ -14,7 +16,7 @@ from users.serializers import CustomUserSerializer
 class CustomUserViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
     queryset = User.objects.all()
-    pagination_class = PagePagination
+    pagination_class = UserPagination
 
     @action(
         detail=True,
@@ -68,11 +70,21 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        author_ids = Follow.objects.filter(
-            user_id=self.request.user.id
-        ).values_list('author', flat=True)
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        limit = get_recipes_limit(request)
+        if limit is not None:
+            latest = Recipe.objects.filter(
+                author_id=OuterRef('author_id')
+            ).order_by('-pub_date', '-id')
+            recipes = recipes.filter(
+                id__in=Subquery(latest.values('id')[:limit])
+            )
         data = self.filter_queryset(
-            User.objects.filter(id__in=author_ids).all()
+            User.objects.filter(author__user=request.user)
+            .annotate(is_subscribed=Value(True, output_field=BooleanField()))
+            .prefetch_related(
+                Prefetch('recipes', queryset=recipes, to_attr='latest_recipes')
+            )
         )
         page = self.paginate_queryset(data)
         serializer = FollowSerializer(
@@ -0,0 +1,30 @@
+from django.contrib import admin
+
+from api.paginations import EstimatedCountPaginator
+from utils.queries import prefix_condition
+
+
+class AdminPaginator(EstimatedCountPaginator):
+    exact_count_below = 10000
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count or scan.
+
+    Page counts come from the planner estimate once it reaches
+    AdminPaginator.exact_count_below, the unfiltered total is never
+    counted, and search is a case-insensitive prefix match on
+    ``search_fields`` so the UpperPatternIndex on each of them is used.
+    """
+
+    paginator = AdminPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        condition = prefix_condition(self.search_fields[0], search_term)
+        for field in self.search_fields[1:]:
+            condition |= prefix_condition(field, search_term)
+        return queryset.filter(condition), False
@@ -0,0 +1,19 @@
+from typing import Iterable, Type
+
+from django.db.models import F, Model
+from django.db.models.functions import Greatest
+
+
+def change_counter(
+    model: Type[Model], ids: Iterable[int], field: str, delta: int
+) -> int:
+    """Add ``delta`` to ``field`` of the given rows in one UPDATE.
+
+    The new value is computed by the database, so concurrent changes are
+    not lost; decrements stop at zero instead of violating the
+    PositiveIntegerField check while counters are not reconciled yet.
+    """
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    return model.objects.filter(id__in=list(ids)).update(**{field: value})
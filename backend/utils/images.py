@@ -0,0 +1,110 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'jpeg': 'jpg', 'webp': 'webp'}
+
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.IMAGE_WORKERS, 1), thread_name_prefix='images'
+)
+
+
+def derivative_name(image_name: str, size: str, image_format: str) -> str:
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, 'derivatives', f'{stem}_{size}.{FORMATS[image_format]}'
+    )
+
+
+def render(image: Image.Image, box, image_format: str) -> ContentFile:
+    resized = image.copy()
+    resized.thumbnail(box, Image.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, format=image_format.upper(), quality=85)
+    return ContentFile(buffer.getvalue())
+
+
+def generate(recipe_id: int) -> None:
+    """Write every size/format derivative of the recipe image to storage.
+
+    ``Recipe.derivatives_of`` is set only if the image was not replaced
+    meanwhile, so the API never points at derivatives of an old image,
+    and bumps the recipes version so cached responses pick the new URLs.
+    """
+    from recipe.models import Recipe
+    from recipe.signals import RECIPES_VERSION
+    from utils.versions import bump_version
+
+    close_old_connections()
+    try:
+        image_name = (
+            Recipe.objects.filter(id=recipe_id)
+            .values_list('image', flat=True)
+            .first()
+        )
+        if not image_name:
+            return
+        with default_storage.open(image_name) as f:
+            image = Image.open(f)
+            image.load()
+        image = image.convert('RGB')
+        for size, box in settings.IMAGE_DERIVATIVES.items():
+            for image_format in FORMATS:
+                name = derivative_name(image_name, size, image_format)
+                default_storage.delete(name)
+                default_storage.save(name, render(image, box, image_format))
+        updated = Recipe.objects.filter(
+            id=recipe_id, image=image_name
+        ).update(derivatives_of=image_name)
+        if updated:
+            bump_version(RECIPES_VERSION)
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить изображения рецепта %s', recipe_id
+        )
+    finally:
+        close_old_connections()
+
+
+def schedule(recipe_id: int) -> None:
+    """Generate derivatives in the worker pool once the write commits."""
+    if settings.IMAGE_WORKERS:
+        transaction.on_commit(lambda: executor.submit(generate, recipe_id))
+
+
+def get_image_urls(recipe, request=None) -> Dict[str, Dict[str, str]]:
+    """URLs of every derivative, or of the original until they exist."""
+    if not recipe.image:
+        return {}
+
+    def absolute(url: str) -> str:
+        return request.build_absolute_uri(url) if request else url
+
+    original = absolute(recipe.image.url)
+    ready = recipe.derivatives_of == recipe.image.name
+    urls: Dict[str, Dict[str, str]] = {}
+    for size in settings.IMAGE_DERIVATIVES:
+        urls[size] = {
+            image_format: (
+                absolute(
+                    default_storage.url(
+                        derivative_name(recipe.image.name, size, image_format)
+                    )
+                )
+                if ready
+                else original
+            )
+            for image_format in FORMATS
+        }
+    return urls
@@ -0,0 +1,271 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Labels, float]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2)
+METRICS_VIEW = 'metrics'
+
+
+class CounterMetric:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        self.values[labels] += amount
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, value in self.values.items():
+            yield self.name, labels, value
+
+
+class HistogramMetric:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        """Per bucket cumulative counts, then the sum and the count."""
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[position] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, counts in self.values.items():
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, counts[:-2] + counts[-1:]):
+                yield f'{self.name}_bucket', labels + (('le', bound),), count
+            yield f'{self.name}_sum', labels, counts[-2]
+            yield f'{self.name}_count', labels, counts[-1]
+
+
+class Registry:
+    """Metrics of this process.
+
+    Every worker process keeps its own registry, so a scrape reports the
+    worker that served it; scrape workers directly, not through a
+    balancer, to see them all.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = CounterMetric(
+            'foodgram_requests_total', 'Requests by view, method and status.'
+        )
+        self.duration = HistogramMetric(
+            'foodgram_request_duration_seconds',
+            'Request latency.',
+            LATENCY_BUCKETS,
+        )
+        self.queries = HistogramMetric(
+            'foodgram_request_queries',
+            'SQL queries per request.',
+            QUERY_BUCKETS,
+        )
+        self.sql_time = CounterMetric(
+            'foodgram_sql_duration_seconds_total', 'Time spent in SQL.'
+        )
+        self.serializer_time = CounterMetric(
+            'foodgram_serializer_duration_seconds_total',
+            'Time spent building serializer data.',
+        )
+        self.size = HistogramMetric(
+            'foodgram_response_size_bytes', 'Response body size.', SIZE_BUCKETS
+        )
+        self.metrics = (
+            self.requests,
+            self.duration,
+            self.queries,
+            self.sql_time,
+            self.serializer_time,
+            self.size,
+        )
+
+    def record(self, labels: Labels, status: int, stats: 'RequestStats'):
+        with self.lock:
+            self.requests.inc(labels + (('status', str(status)),))
+            self.duration.observe(labels, stats.duration)
+            self.queries.observe(labels, len(stats.statements))
+            self.sql_time.inc(labels, stats.sql_time)
+            self.serializer_time.inc(labels, stats.serializer_time)
+            if stats.size is not None:
+                self.size.observe(labels, stats.size)
+
+    def render(self) -> str:
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+registry = Registry()
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements: List[str] = []
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.duration = 0.0
+        self.size: Optional[int] = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook timing every statement."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.statements.append(sql)
+
+    def duplicates(self, limit: int) -> List[Tuple[int, str]]:
+        return [
+            (count, sql)
+            for sql, count in Counter(self.statements).most_common(limit)
+            if count > 1
+        ]
+
+
+current = threading.local()
+
+
+def instrument_serializers() -> None:
+    """Time ``serializer.data`` of the outermost serializer per request.
+
+    Nested serializers are built from inside the outer one, so only the
+    outermost call is counted.
+    """
+    if getattr(BaseSerializer, 'measured', False):
+        return
+    data = BaseSerializer.data.fget
+
+    def measured_data(self):
+        stats = getattr(current, 'stats', None)
+        if stats is None or stats.serializer_depth:
+            return data(self)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return data(self)
+        finally:
+            stats.serializer_depth -= 1
+            stats.serializer_time += time.perf_counter() - start
+
+    BaseSerializer.data = property(measured_data)
+    BaseSerializer.measured = True
+
+
+def get_response_size(response) -> Optional[int]:
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """Record latency, SQL, serializer time and size per resolved view.
+
+    Requests slower than SLOW_REQUEST_THRESHOLD seconds are logged with
+    the statements they ran most often, which is how an N+1 shows up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_serializers()
+
+    def __call__(self, request):
+        stats = current.stats = RequestStats()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current.stats = None
+        stats.duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        if view == METRICS_VIEW:
+            return response
+        stats.size = get_response_size(response)
+        labels = (('view', view), ('method', request.method))
+        registry.record(labels, response.status_code, stats)
+        self.log_slow_request(request, view, stats)
+        return response
+
+    def log_slow_request(self, request, view, stats):
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        if threshold <= 0 or stats.duration < threshold:
+            return
+        duplicates = ''.join(
+            f'\n  {count}x {sql[:300]}'
+            for count, sql in stats.duplicates(
+                settings.SLOW_REQUEST_TOP_QUERIES
+            )
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.3f с, SQL: %d за %.3f с%s',
+            request.method,
+            request.get_full_path(),
+            view,
+            stats.duration,
+            len(stats.statements),
+            stats.sql_time,
+            duplicates,
+        )
+
+
+def metrics(request):
+    """Prometheus scrape endpoint for METRICS_ALLOWED_IPS and staff."""
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
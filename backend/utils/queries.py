@@ -0,0 +1,20 @@
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+from django.db.models import Q
+
+T = TypeVar('T')
+
+
+def batches(rows: Iterable[T], size: int) -> Iterator[List[T]]:
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def prefix_condition(field: str, value: str) -> Q:
+    """Case-insensitive prefix match that an UpperPatternIndex on
+    ``field`` serves."""
+    return Q(**{f'{field}__istartswith': value})
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_PREFIX = 'primary-pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Credentials are read from the primary: a token or session created a
+# moment ago may not have reached the replicas yet.
+PRIMARY_APPS = ('authtoken', 'sessions')
+LAG_QUERIES = {
+    'postgresql': (
+        'SELECT CASE '
+        'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+        'END'
+    ),
+}
+
+state = threading.local()
+
+
+def measure_lag(alias: str) -> float:
+    """Seconds ``alias`` is behind the primary, infinity if unreachable.
+
+    Backends without a lag query, like SQLite copies used locally, count
+    as up to date.
+    """
+    connection = connections[alias]
+    query = LAG_QUERIES.get(connection.vendor)
+    if query is None:
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            (lag,) = cursor.fetchone()
+    except DatabaseError:
+        logger.warning('Реплика %s недоступна', alias, exc_info=True)
+        return float('inf')
+    return float(lag or 0)
+
+
+class ReplicaMonitor:
+    """Replica lag of this process, measured every
+    REPLICA_LAG_CHECK_INTERVAL seconds by whichever read needs it."""
+
+    def __init__(self):
+        self.lags: Dict[str, float] = {}
+        self.checked_at = float('-inf')
+        self.lock = threading.Lock()
+
+    def measure(self) -> None:
+        self.lags = {
+            alias: measure_lag(alias) for alias in settings.REPLICA_DATABASES
+        }
+
+    def healthy(self) -> List[str]:
+        now = time.monotonic()
+        interval = settings.REPLICA_LAG_CHECK_INTERVAL
+        if now - self.checked_at >= interval:
+            with self.lock:
+                if now - self.checked_at >= interval:
+                    self.checked_at = now
+                    self.measure()
+        return [
+            alias
+            for alias, lag in self.lags.items()
+            if lag <= settings.REPLICA_MAX_LAG
+        ]
+
+
+monitor = ReplicaMonitor()
+
+
+@contextmanager
+def primary() -> Iterator[None]:
+    """Read from the primary inside the block.
+
+    For data cached or served under a version, like the recipe responses
+    with an ETag: a lagging replica would label stale rows with the new
+    version, and clients would keep them until the next bump.
+    """
+    previous = getattr(state, 'replica', False)
+    state.replica = False
+    try:
+        yield
+    finally:
+        state.replica = previous
+
+
+class ReplicaRouter:
+    """Reads of safe-method requests go to a replica, the rest to default.
+
+    Management commands, workers and unsafe requests never see a replica,
+    nor do reads inside a transaction on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not getattr(state, 'replica', False):
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = monitor.healthy()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def get_pin_key(request) -> Optional[str]:
+    """Cache key of the client: its token, else its session cookie."""
+    credentials = request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return f'{PIN_PREFIX}:{digest}'
+
+
+class ReplicaMiddleware:
+    """Let safe requests read from replicas, except right after a write.
+
+    An unsafe request pins its client to the primary for
+    REPLICA_PIN_SECONDS, so the client reads its own writes even from a
+    process other than the one that made them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.REPLICA_DATABASES and isinstance(
+            caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)
+        ):
+            raise ImproperlyConfigured(
+                'Для реплик нужен общий для всех процессов кэш: '
+                'задайте CACHE_BACKEND'
+            )
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        key = get_pin_key(request)
+        if request.method in SAFE_METHODS:
+            state.replica = key is None or not cache.get(key)
+        try:
+            return self.get_response(request)
+        finally:
+            state.replica = False
+            if request.method not in SAFE_METHODS and key is not None:
+                cache.set(key, True, settings.REPLICA_PIN_SECONDS)
@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from django.conf import settings
+from django.http import FileResponse
+
+from utils.to_pdf import TITLE, render_pdf
+
+FILE_NAME = 'Shopping_cart'
+RENDERER_VERSION = 1
+CSV_HEADER = ('Ингредиент', 'Единицы измерения', 'Количество')
+# Files used this recently are never trimmed, so a request that has just
+# rendered one can still open it.
+TRIM_MIN_AGE = 60
+
+Row = Tuple[str, str, int]
+
+render_pool = ThreadPoolExecutor(
+    max_workers=settings.SHOPPING_LIST_RENDER_WORKERS,
+    thread_name_prefix='render',
+)
+rendering: Dict[str, Future] = {}
+rendering_lock = threading.Lock()
+
+
+def get_rows(data: Iterable[Dict[str, Union[str, int]]]) -> List[Row]:
+    return [
+        (item['name'], item['measurement_unit'], item['amount'])
+        for item in data
+    ]
+
+
+def get_lines(rows: List[Row]) -> List[str]:
+    return [
+        f'{number}. {name} ({measurement_unit}) - {amount}'
+        for number, (name, measurement_unit, amount) in enumerate(rows, 1)
+    ]
+
+
+def render_pdf_rows(rows: List[Row], stream: BinaryIO) -> None:
+    render_pdf(get_lines(rows), stream)
+
+
+def render_txt(rows: List[Row], stream: BinaryIO) -> None:
+    stream.write(f'{TITLE}\n\n'.encode('utf-8'))
+    for line in get_lines(rows):
+        stream.write(f'{line}\n'.encode('utf-8'))
+
+
+def render_csv(rows: List[Row], stream: BinaryIO) -> None:
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    writer.writerow(CSV_HEADER)
+    writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+RENDERERS = {
+    'pdf': (render_pdf_rows, 'application/pdf'),
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def get_cache_key(rows: List[Row], file_format: str) -> str:
+    payload = json.dumps(
+        [RENDERER_VERSION, file_format, rows], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def open_cached(path: str) -> Optional[BinaryIO]:
+    """Open a rendered file and mark it used, None if it is gone.
+
+    ``trim_cache`` and ``expire_exports`` may delete the file at any
+    moment; once open, it stays readable until closed.
+    """
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return file
+
+
+def trim_cache() -> int:
+    """Delete the least recently used files beyond
+    SHOPPING_LIST_CACHE_MAX_FILES, return how many were deleted.
+
+    Runs after every render, so the cache stays bounded without
+    run_export_worker; only files unused for TRIM_MIN_AGE seconds go.
+    """
+    files = []
+    with os.scandir(settings.SHOPPING_LIST_CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                files.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    excess = len(files) - settings.SHOPPING_LIST_CACHE_MAX_FILES
+    unused_since = time.time() - TRIM_MIN_AGE
+    deleted = 0
+    for mtime, path in sorted(files)[:max(excess, 0)]:
+        if mtime > unused_since:
+            break
+        try:
+            os.unlink(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def write_file(
+    render: Callable[[List[Row], BinaryIO], None], rows: List[Row], path: str
+) -> None:
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=cache_dir, prefix='.', delete=False
+    ) as tmp:
+        try:
+            render(rows, tmp)
+        except Exception:
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+    render_pool.submit(trim_cache)
+
+
+def render_file(rows: List[Row], file_format: str, path: str) -> None:
+    """Render into ``path`` on ``render_pool``, once for concurrent
+    requests of the same file."""
+    render, _ = RENDERERS[file_format]
+    with rendering_lock:
+        future = rendering.get(path)
+        if future is None:
+            future = render_pool.submit(write_file, render, rows, path)
+            rendering[path] = future
+            future.add_done_callback(lambda _: rendering.pop(path, None))
+    future.result()
+
+
+def open_shopping_list(rows: List[Row], file_format: str) -> BinaryIO:
+    """Open the rendered list, rendering it on a cache miss.
+
+    Files are addressed by a hash of the aggregated cart, so an unchanged
+    cart is served from disk without being rendered again. Rendering runs
+    on ``render_pool``, which caps how many renders share the CPU, and
+    concurrent requests for the same file wait for a single render. The
+    request thread still blocks until the file is written.
+    """
+    path = os.path.join(
+        settings.SHOPPING_LIST_CACHE_DIR,
+        f'{get_cache_key(rows, file_format)}.{file_format}',
+    )
+    file = open_cached(path)
+    if file is None:
+        render_file(rows, file_format, path)
+        file = open(path, 'rb')
+    return file
+
+
+def get_shopping_list(
+    data: Iterable[Dict[str, Union[str, int]]], file_format: str = 'pdf'
+) -> FileResponse:
+    rows = get_rows(data)
+    _, content_type = RENDERERS[file_format]
+    return FileResponse(
+        open_shopping_list(rows, file_format),
+        as_attachment=True,
+        filename=f'{FILE_NAME}.{file_format}',
+        content_type=content_type,
+    )
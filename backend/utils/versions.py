@@ -0,0 +1,172 @@
+import time
+from collections import defaultdict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from django.core.cache import cache
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from recipe.models import Version
+from utils.transactions import on_commit_once
+
+CHANGE_PREFIX = 'changes'
+CHANGE_TIMEOUT = 24 * 60 * 60
+
+listeners: Dict[str, List[Callable[[], None]]] = defaultdict(list)
+
+
+def user_version(user_id: int) -> str:
+    return f'user:{user_id}'
+
+
+def initial_version() -> int:
+    """Start counters from the clock, so a deleted counter never restarts
+    at a value some process has already cached data under."""
+    return int(time.time() * 1000)
+
+
+def get_database() -> str:
+    """Versions are read where they are written: every process must see a
+    bump at once, which neither a per-process cache nor a lagging replica
+    guarantees."""
+    return router.db_for_write(Version)
+
+
+def versions() -> QuerySet:
+    return Version.objects.using(get_database())
+
+
+def create_version(name: str) -> int:
+    try:
+        with transaction.atomic(using=get_database()):
+            return versions().create(name=name, value=initial_version()).value
+    except IntegrityError:
+        return versions().get(name=name).value
+
+
+def get_version(name: str) -> int:
+    value = versions().filter(name=name).values_list('value', flat=True)
+    value = value.first()
+    if value is None:
+        value = create_version(name)
+    return value
+
+
+def get_stamps(names: Iterable[str]) -> Dict[str, Tuple[int, Optional[float]]]:
+    """Return ``(version, modified timestamp)`` for each name in one read."""
+    names = list(names)
+    rows = {
+        name: (value, modified)
+        for name, value, modified in versions()
+        .filter(name__in=names)
+        .values_list('name', 'value', 'modified')
+    }
+    stamps = {}
+    for name in names:
+        version, modified = rows.get(name, (None, None))
+        if version is None:
+            version = get_version(name)
+        stamps[name] = (
+            version,
+            modified.timestamp() if modified is not None else None,
+        )
+    return stamps
+
+
+def on_bump(name: str, callback: Callable[[], None]) -> None:
+    """Call ``callback`` whenever this process bumps ``name``."""
+    listeners[name].append(callback)
+
+
+def increment(name: str) -> Optional[int]:
+    """Atomically add one to the counter, None if it does not exist."""
+    connection = connections[get_database()]
+    quote_name = connection.ops.quote_name
+    table = quote_name(Version._meta.db_table)
+    value = quote_name('value')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET {value} = {value} + 1, '
+            f'{quote_name("modified")} = %s '
+            f'WHERE {quote_name("name")} = %s '
+            f'RETURNING {value}',
+            [
+                connection.ops.adapt_datetimefield_value(timezone.now()),
+                name,
+            ],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def bump_version(name: str) -> int:
+    version = increment(name)
+    if version is None:
+        create_version(name)
+        version = increment(name)
+    for callback in listeners[name]:
+        callback()
+    return version
+
+
+def bump_versions(names: Set[str]) -> None:
+    for name in sorted(names):
+        bump_version(name)
+
+
+def bump_on_commit(*names: str) -> None:
+    """Bump versions once the current transaction commits.
+
+    Bumping earlier would let a concurrent reader stamp stale data with
+    the new version. Each name is bumped once per transaction, however
+    many rows asked for it.
+    """
+    for name in names:
+        on_commit_once(bump_versions, name)
+
+
+def change_key(name: str, version: int) -> str:
+    return f'{CHANGE_PREFIX}:{name}:{version}'
+
+
+def log_changes(changes: Set[Tuple[str, Hashable]]) -> None:
+    items = defaultdict(list)
+    for name, item in changes:
+        items[name].append(item)
+    for name in sorted(items):
+        version = bump_version(name)
+        cache.set(change_key(name, version), items[name], CHANGE_TIMEOUT)
+
+
+def log_change_on_commit(name: str, item: Hashable) -> None:
+    """Bump ``name`` on commit and store ``item`` under the new version.
+
+    Lets in-process indexes replay what changed between two versions
+    instead of reloading everything. Items logged in one transaction
+    share a single bump. The log is kept in the cache: with a
+    per-process cache, other processes find gaps and reload instead.
+    """
+    on_commit_once(log_changes, (name, item))
+
+
+def get_changes(name: str, since: int, until: int) -> Optional[List[Any]]:
+    """Items logged after version ``since`` up to ``until``, or None if
+    any of them is missing from the cache."""
+    keys = [
+        change_key(name, version) for version in range(since + 1, until + 1)
+    ]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return [item for key in keys for item in changes[key]]